@@ -0,0 +1,193 @@
+"""
+Buffered view / click tracking.
+
+`track()` is called inside request handlers and only appends a tuple to a
+bounded in-memory ring, so it costs well under a microsecond and never
+touches the DB. A background task drains the ring every few seconds and
+writes one batch of raw events (to the `events` table, or to hourly
+JSONL files with ANALYTICS_SINK=file) plus one upsert of per-item hourly
+counters into `item_event_counts`.
+
+If the flusher falls behind, the oldest buffered events are dropped
+(and counted in `dropped`) rather than growing memory or slowing requests.
+A batch that fails because the DB is unreachable goes back into the ring
+for the next tick; one that fails on its data is retried event by event
+and the events that still fail are dropped (counted in `rejected`), so a
+single bad row can't wedge the pipeline.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, insert, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from models import Event, ItemEventCount
+
+BUFFER_SIZE    = int(os.getenv("ANALYTICS_BUFFER", "100000"))
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))
+FLUSH_BATCH    = int(os.getenv("ANALYTICS_FLUSH_BATCH", "5000"))
+SINK           = os.getenv("ANALYTICS_SINK", "db")            # "db" or "file"
+EVENTS_DIR     = os.getenv("ANALYTICS_DIR", "events")
+MAX_ID         = 2**31 - 1                                    # INTEGER columns
+
+# (epoch seconds, kind, item_id, user_id)
+EventTuple = Tuple[float, str, int, Optional[int]]
+
+
+def _hour(ts: float) -> datetime:
+    # naive UTC, like the rest of the models
+    return datetime.fromtimestamp(ts - ts % 3600, timezone.utc).replace(tzinfo=None)
+
+
+class EventBuffer:
+    def __init__(self, maxlen: int = BUFFER_SIZE):
+        self._ring: Deque[EventTuple] = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.rejected = 0
+        # only one flusher drains at a time; producers never take this lock
+        self._flush_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def track(self, kind: str, item_id: int, user_id: Optional[int] = None) -> None:
+        if not 0 < item_id <= MAX_ID:
+            self.rejected += 1      # would never fit the column
+            return
+        ring = self._ring
+        if len(ring) == ring.maxlen:
+            self.dropped += 1       # deque evicts the oldest for us
+        ring.append((time.time(), kind, item_id, user_id))
+
+    def drain(self, limit: int = FLUSH_BATCH) -> List[EventTuple]:
+        out = []
+        pop = self._ring.popleft
+        try:
+            for _ in range(limit):
+                out.append(pop())
+        except IndexError:
+            pass
+        return out
+
+    def requeue(self, batch: List[EventTuple]) -> None:
+        """Put `batch` back in front, dropping its oldest events if the ring is full."""
+        ring = self._ring
+        excess = len(batch) - (ring.maxlen - len(ring))
+        if excess > 0:
+            self.dropped += excess
+            batch = batch[excess:]
+        ring.extendleft(reversed(batch))
+
+    # ─── Flushing ─────────────────────────────────────────────────────────────
+
+    def flush(self, db: Session, sink: str = SINK, events_dir: str = EVENTS_DIR) -> int:
+        """Write everything buffered so far; returns the number of events."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self.drain()
+                if not batch:
+                    return written
+                try:
+                    _store(db, batch, sink)
+                except Exception as e:
+                    db.rollback()
+                    if _transient(e):
+                        self.requeue(batch)
+                        raise
+                    batch = self._store_each(db, batch, sink)
+                if sink == "file":
+                    # after the commit, so a retried batch is never written twice
+                    _write_files(batch, events_dir)
+                written += len(batch)
+
+    def _store_each(self, db: Session, batch: List[EventTuple], sink: str) -> List[EventTuple]:
+        """Retry one event at a time; returns the ones that went in."""
+        stored = []
+        for n, event in enumerate(batch):
+            try:
+                _store(db, [event], sink)
+            except Exception as e:
+                db.rollback()
+                if _transient(e):
+                    self.requeue(batch[n:])
+                    raise
+                self.rejected += 1
+                print("Analytics event rejected:", event, e)
+                continue
+            stored.append(event)
+        return stored
+
+
+def _transient(e: Exception) -> bool:
+    # the DB is down or the connection broke: worth retrying the same rows later
+    return (isinstance(e, (OperationalError, InterfaceError))
+            or (isinstance(e, DBAPIError) and e.connection_invalidated))
+
+
+def _store(db: Session, batch: List[EventTuple], sink: str) -> None:
+    if sink != "file":
+        db.execute(insert(Event.__table__), [
+            {"kind": k, "item_id": i, "user_id": u,
+             "created_at": datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)}
+            for ts, k, i, u in batch
+        ])
+    _bump_counters(db, batch)
+    db.commit()
+
+
+def _write_files(batch: List[EventTuple], events_dir: str) -> None:
+    """Append to one JSONL file per UTC hour."""
+    os.makedirs(events_dir, exist_ok=True)
+    by_file = {}
+    for ts, kind, item_id, user_id in batch:
+        name = _hour(ts).strftime("%Y%m%d%H") + ".jsonl"
+        by_file.setdefault(name, []).append(json.dumps(
+            {"ts": ts, "kind": kind, "item_id": item_id, "user_id": user_id},
+            separators=(",", ":"),
+        ))
+    for name, lines in by_file.items():
+        with open(os.path.join(events_dir, name), "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _bump_counters(db: Session, batch: List[EventTuple]) -> None:
+    counts = Counter((item_id, _hour(ts), kind) for ts, kind, item_id, _ in batch)
+    t = ItemEventCount.__table__
+    keys = list(counts)
+
+    existing = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        existing.update(
+            tuple(row) for row in
+            db.query(ItemEventCount.item_id, ItemEventCount.hour, ItemEventCount.kind)
+              .filter(ItemEventCount.item_id.in_({k[0] for k in chunk}),
+                      ItemEventCount.hour.in_({k[1] for k in chunk}))
+        )
+
+    inserts = [{"item_id": i, "hour": h, "kind": k, "count": n}
+               for (i, h, k), n in counts.items() if (i, h, k) not in existing]
+    updates = [{"b_item": i, "b_hour": h, "b_kind": k, "n": n}
+               for (i, h, k), n in counts.items() if (i, h, k) in existing]
+    if inserts:
+        db.execute(insert(t), inserts)
+    if updates:
+        db.execute(
+            update(t)
+            .where(and_(t.c.item_id == bindparam("b_item"),
+                        t.c.hour == bindparam("b_hour"),
+                        t.c.kind == bindparam("b_kind")))
+            .values(count=t.c.count + bindparam("n")),
+            updates,
+        )
+
+
+events = EventBuffer()
+track = events.track
@@ -0,0 +1,292 @@
+"""
+Tiered storage for chat history.
+
+Messages older than CHAT_RETENTION_DAYS are moved out of the `messages`
+table into per-room, append-only segment files:
+
+    <CHAT_ARCHIVE_DIR>/room-<quoted room>/
+        00000001.seg    zlib-compressed blocks of JSON lines, back to back
+        index.bin       one fixed-size record per block (sparse ts index)
+
+Each index record is (first_ts, last_ts, max_id, segment, offset, length,
+count). Reads binary-search the index and mmap the segment, so loading a
+page of old history only inflates the blocks it needs.
+
+Run `python archive.py` from cron, or let main.py's startup task do it.
+Appends to a room take an exclusive `flock` on its `lock` file, so several
+workers (and cron) can archive at once without interleaving segment bytes
+or archiving a message twice.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+from sqlalchemy.orm import Session, joinedload
+
+from models import Message
+
+try:
+    import fcntl
+except ImportError:             # not on Windows: run a single archiver there
+    fcntl = None
+
+ARCHIVE_DIR        = os.getenv("CHAT_ARCHIVE_DIR", "chat_archive")
+RETENTION_DAYS     = float(os.getenv("CHAT_RETENTION_DAYS", "30"))
+BLOCK_MESSAGES     = int(os.getenv("CHAT_ARCHIVE_BLOCK", "256"))
+SEGMENT_MAX_BYTES  = int(os.getenv("CHAT_ARCHIVE_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+
+# first_ts, last_ts, max_id, segment, offset, length, count
+_INDEX = struct.Struct("<ddqIQII")
+
+
+def _epoch(ts: datetime) -> float:
+    # Message.timestamp is naive UTC
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+
+ROOM_PREFIX = "room-"
+
+
+def valid_room(room: str) -> bool:
+    # "", ".", ".." etc. are never real rooms
+    return bool(room.strip("."))
+
+
+def _room_dir(room: str, base: str) -> str:
+    # the prefix means no room name can resolve to "." or ".."
+    return os.path.join(base, ROOM_PREFIX + quote(room, safe=""))
+
+
+def _segment_path(room_dir: str, segment: int) -> str:
+    return os.path.join(room_dir, f"{segment:08d}.seg")
+
+
+# ─── Per-room archive ──────────────────────────────────────────────────────────
+
+class RoomArchive:
+    """Append-only segments + sparse index for a single chat room."""
+
+    def __init__(self, room: str, base: str = ARCHIVE_DIR):
+        self.room = room
+        self.dir = _room_dir(room, base)
+        self.index_path = os.path.join(self.dir, "index.bin")
+        self._index: Optional[List[tuple]] = None
+        self._index_stamp: tuple = ()
+
+    def index(self) -> List[tuple]:
+        """Index records, re-read only if another process appended."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return []
+        stamp = (st.st_mtime, st.st_size)
+        if self._index is None or stamp != self._index_stamp:
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % _INDEX.size    # ignore a torn tail
+            self._index = [rec for rec in _INDEX.iter_unpack(raw[:usable])]
+            self._index_stamp = stamp
+        return self._index
+
+    def max_id(self) -> int:
+        idx = self.index()
+        return max((rec[2] for rec in idx), default=0)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, "lock"), "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield                   # closing the file releases the lock
+
+    def append(self, rows: List[dict]) -> int:
+        """
+        Append rows (sorted by ts, each with "id", "ts" epoch seconds,
+        "sender", "content") as compressed blocks, skipping any already
+        archived (id <= max_id()). Returns how many were written.
+        """
+        if not rows:
+            return 0
+        with self._locked():
+            self._index = None          # another process may have appended
+            if self.index():
+                done = self.max_id()
+                rows = [r for r in rows if r["id"] > done]
+            if rows:
+                self._append(rows)
+        return len(rows)
+
+    def _append(self, rows: List[dict]) -> None:
+        idx = self.index()
+        segment = idx[-1][3] if idx else 1
+        path = _segment_path(self.dir, segment)
+
+        records = []
+        for start in range(0, len(rows), BLOCK_MESSAGES):
+            block = rows[start:start + BLOCK_MESSAGES]
+            payload = zlib.compress(
+                "\n".join(json.dumps(r, separators=(",", ":")) for r in block).encode(),
+                6,
+            )
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+            if offset and offset + len(payload) > SEGMENT_MAX_BYTES:
+                segment += 1
+                path = _segment_path(self.dir, segment)
+                offset = 0
+            with open(path, "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            records.append(_INDEX.pack(
+                block[0]["ts"], block[-1]["ts"], max(r["id"] for r in block),
+                segment, offset, len(payload), len(block),
+            ))
+
+        # index goes last: a crash before this leaves unreferenced bytes only
+        with open(self.index_path, "ab") as f:
+            f.write(b"".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        self._index = None
+
+    def _read_block(self, rec: tuple, maps: Dict[int, mmap.mmap]) -> List[dict]:
+        _, _, _, segment, offset, length, _ = rec
+        if segment not in maps:
+            with open(_segment_path(self.dir, segment), "rb") as f:
+                maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        raw = zlib.decompress(maps[segment][offset:offset + length])
+        return [json.loads(line) for line in raw.split(b"\n")]
+
+    def before(self, ts: Optional[float], limit: int) -> List[dict]:
+        """Up to `limit` newest archived rows older than `ts`, oldest first."""
+        idx = self.index()
+        if not idx or limit <= 0:
+            return []
+        # blocks are appended in time order, so first_ts is sorted
+        end = len(idx) if ts is None else bisect.bisect_left([r[0] for r in idx], ts)
+
+        out: List[dict] = []
+        maps: Dict[int, mmap.mmap] = {}
+        try:
+            for i in range(end - 1, -1, -1):
+                rows = self._read_block(idx[i], maps)
+                if ts is not None:
+                    rows = [r for r in rows if r["ts"] < ts]
+                out[:0] = rows
+                if len(out) >= limit:
+                    break
+        finally:
+            for m in maps.values():
+                m.close()
+        return out[-limit:]
+
+
+def archived_rooms(base: str = ARCHIVE_DIR) -> List[str]:
+    try:
+        return [unquote(d[len(ROOM_PREFIX):]) for d in os.listdir(base)
+                if d.startswith(ROOM_PREFIX) and os.path.isdir(os.path.join(base, d))]
+    except FileNotFoundError:
+        return []
+
+
+# ─── Moving rows out of the live table ────────────────────────────────────────
+
+def archive_old_messages(db: Session, older_than: Optional[timedelta] = None,
+                         batch: int = 5000, base: str = ARCHIVE_DIR) -> int:
+    """
+    Move messages older than `older_than` into the archive, `batch` rows per
+    transaction. Safe to re-run after a crash: rows already in a room's
+    archive (id <= its max archived id) are only deleted, never re-appended.
+    """
+    cutoff = datetime.utcnow() - (older_than or timedelta(days=RETENTION_DAYS))
+    moved = 0
+    archives: Dict[str, RoomArchive] = {}
+
+    while True:
+        msgs = (db.query(Message)
+                  .options(joinedload(Message.sender))
+                  .filter(Message.timestamp < cutoff, Message.room.isnot(None))
+                  .order_by(Message.room, Message.timestamp, Message.id)
+                  .limit(batch)
+                  .all())
+        if not msgs:
+            break
+
+        by_room: Dict[str, List[Message]] = {}
+        for m in msgs:
+            by_room.setdefault(m.room, []).append(m)
+
+        for room, room_msgs in by_room.items():
+            arc = archives.setdefault(room, RoomArchive(room, base))
+            arc.append([
+                {
+                    "id": m.id,
+                    "ts": _epoch(m.timestamp),
+                    "sender": m.sender.username if m.sender else None,
+                    "content": m.content,
+                }
+                for m in room_msgs
+            ])
+
+        (db.query(Message)
+           .filter(Message.id.in_([m.id for m in msgs]))
+           .delete(synchronize_session=False))
+        db.commit()
+        moved += len(msgs)
+    return moved
+
+
+# ─── History reads (live table first, then archive) ───────────────────────────
+
+def _frame(sender: Optional[str], content: str, ts: datetime) -> dict:
+    return {"sender": sender, "content": content, "ts": ts.isoformat()}
+
+
+def load_history(db: Session, room: str, before: Optional[datetime] = None,
+                 limit: int = 50, base: str = ARCHIVE_DIR) -> List[dict]:
+    """
+    The `limit` newest messages in `room` older than `before` (all if None),
+    oldest first, in the same shape ws_chat sends. Falls through to the
+    archive when the live table runs out.
+    """
+    q = (db.query(Message)
+           .options(joinedload(Message.sender))
+           .filter(Message.room == room))
+    if before is not None:
+        q = q.filter(Message.timestamp < before)
+    live = q.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+    live.reverse()
+
+    frames = [_frame(m.sender.username if m.sender else None, m.content, m.timestamp)
+              for m in live]
+    missing = limit - len(frames)
+    if missing > 0:
+        if live:
+            edge = _epoch(live[0].timestamp)
+        else:
+            edge = _epoch(before) if before is not None else None
+        old = RoomArchive(room, base).before(edge, missing)
+        frames[:0] = [
+            _frame(r["sender"], r["content"],
+                   datetime.fromtimestamp(r["ts"], timezone.utc).replace(tzinfo=None))
+            for r in old
+        ]
+    return frames
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"archived {archive_old_messages(db)} messages")
+    finally:
+        db.close()
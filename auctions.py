@@ -0,0 +1,225 @@
+"""
+Timed auctions: open at `Item.auction_start`, close at `Item.auction_end`.
+
+All deadlines live in one min-heap served by a single task on the event
+loop, so thousands of auctions cost one sleeping coroutine rather than a
+timer task (or a DB poll) each. Rescheduling just pushes a new heap entry;
+stale entries are recognised and skipped when they surface.
+
+Bids that land within SOFT_CLOSE_SECONDS of the end push it out to
+now + EXTENSION_SECONDS (anti-sniping). When an auction closes, the highest
+bid wins and main.py broadcasts the result through `auction_mgr`.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import Bid, Item
+
+SOFT_CLOSE_SECONDS = float(os.getenv("AUCTION_SOFT_CLOSE", "30"))
+EXTENSION_SECONDS  = float(os.getenv("AUCTION_EXTENSION", "30"))
+
+Callback = Callable[[int], Awaitable[None]]
+
+
+def to_epoch(ts: datetime) -> float:
+    # model timestamps are naive UTC
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+
+def from_epoch(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+class AuctionScheduler:
+    def __init__(self, soft_close: float = SOFT_CLOSE_SECONDS,
+                 extension: float = EXTENSION_SECONDS):
+        self.soft_close = soft_close
+        self.extension = extension
+        self.on_start: Optional[Callback] = None
+        self.on_close: Optional[Callback] = None
+
+        # (when, seq, item_id, "start" | "end")
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._seq = itertools.count()
+        self._starts: Dict[int, float] = {}     # not yet opened
+        self._ends: Dict[int, float] = {}       # not yet closed
+        self._closed: Set[int] = set()          # closed, until rescheduled or cancelled
+        self._lock = threading.Lock()           # admin routes run in the threadpool
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # ─── Scheduling ───────────────────────────────────────────────────────────
+
+    def schedule(self, item_id: int, start: Optional[float], end: float) -> None:
+        with self._lock:
+            self._closed.discard(item_id)
+            self._starts.pop(item_id, None)
+            if start is not None:
+                self._starts[item_id] = start
+                self._push(start, item_id, "start")
+            self._ends[item_id] = end
+            self._push(end, item_id, "end")
+        self._poke()
+
+    def cancel(self, item_id: int) -> None:
+        with self._lock:
+            self._starts.pop(item_id, None)
+            self._ends.pop(item_id, None)
+            self._closed.discard(item_id)
+
+    def mark_closed(self, item_id: int) -> None:
+        with self._lock:
+            self._closed.add(item_id)
+
+    def _push(self, when: float, item_id: int, kind: str) -> None:
+        heapq.heappush(self._heap, (when, next(self._seq), item_id, kind))
+
+    def _poke(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ─── Queries used on the bid path (no DB) ─────────────────────────────────
+
+    def is_scheduled(self, item_id: int) -> bool:
+        return item_id in self._ends
+
+    def is_open(self, item_id: int, now: Optional[float] = None) -> bool:
+        end = self._ends.get(item_id)
+        if end is None:
+            return False
+        now = time.time() if now is None else now
+        start = self._starts.get(item_id)
+        return (start is None or start <= now) and now < end
+
+    def accepts_bids(self, item_id: int, now: Optional[float] = None) -> bool:
+        """Untimed auctions always do; timed ones only between start and (extended) end."""
+        if item_id in self._closed:
+            return False
+        if item_id not in self._ends:
+            return True
+        return self.is_open(item_id, now)
+
+    def ends_at(self, item_id: int) -> Optional[float]:
+        return self._ends.get(item_id)
+
+    def bid_placed(self, item_id: int, now: Optional[float] = None) -> Optional[float]:
+        """Apply the soft close; returns the new end time if it moved."""
+        now = time.time() if now is None else now
+        with self._lock:
+            end = self._ends.get(item_id)
+            if end is None or end - now >= self.soft_close:
+                return None
+            new_end = now + self.extension
+            if new_end <= end:
+                return None
+            self._ends[item_id] = new_end
+            self._push(new_end, item_id, "end")
+        self._poke()
+        return new_end
+
+    # ─── Runner ───────────────────────────────────────────────────────────────
+
+    def _pop_due(self, now: float) -> Tuple[List[Tuple[int, str]], Optional[float]]:
+        """Remove due events; returns them plus the next wake-up time."""
+        due = []
+        with self._lock:
+            while self._heap:
+                when, _, item_id, kind = self._heap[0]
+                current = (self._starts if kind == "start" else self._ends).get(item_id)
+                if current != when:                 # rescheduled or cancelled
+                    heapq.heappop(self._heap)
+                    continue
+                if when > now:
+                    return due, when
+                heapq.heappop(self._heap)
+                if kind == "start":
+                    del self._starts[item_id]
+                else:
+                    del self._ends[item_id]
+                    self._closed.add(item_id)       # bids are refused from here on
+                due.append((item_id, kind))
+        return due, None
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            # clear first so a schedule() racing with _pop_due still wakes us
+            self._wake.clear()
+            due, next_at = self._pop_due(time.time())
+            for item_id, kind in due:
+                callback = self.on_start if kind == "start" else self.on_close
+                if callback is None:
+                    continue
+                try:
+                    await callback(item_id)
+                except Exception as e:
+                    print(f"Auction {kind} error for item {item_id}:", e)
+            if due:
+                continue
+            timeout = None if next_at is None else max(0.0, next_at - time.time())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+# ─── DB side ───────────────────────────────────────────────────────────────────
+
+def load_schedule(db: Session, scheduler: "AuctionScheduler") -> int:
+    """
+    Re-arm every timed auction without a winner. Ones that ended while the
+    server was down close straight away (re-closing one that had no bids
+    is harmless); ones with a winner stay closed to bids.
+    """
+    n, now = 0, time.time()
+    rows = (db.query(Item.id, Item.auction_start, Item.auction_end, Item.winner_id)
+              .filter(Item.auction_end.isnot(None)))
+    for item_id, start, end, winner_id in rows:
+        if winner_id is not None:
+            scheduler.mark_closed(item_id)
+            continue
+        start = to_epoch(start) if start else None
+        scheduler.schedule(item_id, start if start and start > now else None, to_epoch(end))
+        n += 1
+    return n
+
+
+def highest_bid(db: Session, item_id: int) -> Optional[Bid]:
+    """Highest bid of the current run: placed between auction_start and auction_end, if set."""
+    return (db.query(Bid).join(Item, Item.id == Bid.item_id)
+              .filter(Bid.item_id == item_id,
+                      or_(Item.auction_start.is_(None), Bid.timestamp >= Item.auction_start),
+                      or_(Item.auction_end.is_(None), Bid.timestamp <= Item.auction_end))
+              .order_by(Bid.amount.desc(), Bid.timestamp).first())
+
+
+def open_auction(db: Session, item_id: int) -> None:
+    item = db.get(Item, item_id)
+    if item:
+        item.auction_live = True
+        db.commit()
+
+
+def close_auction(db: Session, item_id: int) -> Optional[Bid]:
+    """Mark the auction over and record the highest bidder; returns the winning bid."""
+    item = db.get(Item, item_id)
+    if not item:
+        return None
+    winner = highest_bid(db, item_id)
+    item.auction_live = False
+    item.winner_id = winner.user_id if winner else None
+    db.commit()
+    return winner
+
+
+scheduler = AuctionScheduler()
@@ -0,0 +1,332 @@
+"""
+Bulk catalog import / export for Items.
+
+Imports stream CSV or JSONL rows, validate each one with `ItemCreate`, and
+write them in chunks (one executemany INSERT plus one bulk UPDATE per
+chunk). Rows that carry an `id` already in the table update it, touching
+only the columns the row actually has; all other rows are inserted. If a
+chunk fails in the DB it is rolled back and retried row by row, so one bad
+row is reported in the result instead of aborting the import.
+
+Remote `image_url`s (http/https) are downloaded into app/static/uploads in
+parallel, one thread pool per chunk. Only JPEG, PNG, GIF and WebP are kept
+(by Content-Type, checked against the file's magic bytes), up to
+CATALOG_IMAGE_MAX_BYTES; anything else keeps its remote URL.
+
+Exports walk the table by primary key (keyset pagination), so memory stays
+flat however big the catalog is.
+
+    python catalog.py import items.csv
+    python catalog.py export items.jsonl
+"""
+import csv
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.request import urlopen
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import Item
+from schemas import ItemCreate
+
+CHUNK_SIZE      = int(os.getenv("CATALOG_CHUNK", "1000"))
+IMAGE_WORKERS   = int(os.getenv("CATALOG_IMAGE_WORKERS", "8"))
+IMAGE_TIMEOUT   = float(os.getenv("CATALOG_IMAGE_TIMEOUT", "10"))
+IMAGE_MAX_BYTES = int(os.getenv("CATALOG_IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_DIR      = "app/static/uploads"
+MAX_ERRORS      = 100
+MAX_ID          = 2**31 - 1       # INTEGER primary key
+
+EXPORT_FIELDS = ["id", "name", "description", "price", "image_url"]
+OPTIONAL_FIELDS = ("description", "image_url")
+
+# Content-Type → (extension, magic prefix); no SVG, it can carry script
+IMAGE_TYPES = {
+    "image/jpeg": (".jpg", b"\xff\xd8\xff"),
+    "image/png":  (".png", b"\x89PNG\r\n\x1a\n"),
+    "image/gif":  (".gif", b"GIF8"),
+    "image/webp": (".webp", b"RIFF"),
+}
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def error(self, line: int, msg: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line, "error": msg})
+
+
+# ─── Reading ───────────────────────────────────────────────────────────────────
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def iter_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (line number, raw row) pairs without reading the whole file."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for lineno, line in enumerate(text, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield lineno, json.loads(line)
+            except json.JSONDecodeError:
+                yield lineno, line      # rejected by _validate
+
+
+def _validate(raw: dict) -> dict:
+    """
+    ItemCreate-validated row, plus the optional id used for upserts.
+    Optional columns the source row doesn't have are left out, so an
+    update doesn't blank them.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("row is not a JSON object")
+    item = ItemCreate(
+        name=raw.get("name"),
+        description=raw.get("description") or None,
+        price=raw.get("price"),
+        image_url=raw.get("image_url") or None,
+    )
+    row = item.model_dump(include={"name", "price"} | {f for f in OPTIONAL_FIELDS if f in raw})
+    if raw.get("id") not in (None, ""):
+        row["id"] = int(raw["id"])
+        if not 1 <= row["id"] <= MAX_ID:
+            raise ValueError(f"id {row['id']} out of range")
+    return row
+
+
+# ─── Images ────────────────────────────────────────────────────────────────────
+
+def _fetch_image(url: str) -> str:
+    """Download the image at `url` into UPLOAD_DIR and return its /static path."""
+    with urlopen(url, timeout=IMAGE_TIMEOUT) as resp:
+        ctype = resp.headers.get_content_type()
+        if ctype not in IMAGE_TYPES:
+            raise ValueError(f"not an allowed image type: {ctype}")
+        ext, magic = IMAGE_TYPES[ctype]
+        length = resp.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > IMAGE_MAX_BYTES:
+            raise ValueError(f"image larger than {IMAGE_MAX_BYTES} bytes")
+
+        name = f"{uuid.uuid4().hex}{ext}"
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            with open(path, "wb") as f:
+                size = 0
+                while chunk := resp.read(64 * 1024):
+                    if size == 0 and not chunk.startswith(magic):
+                        raise ValueError(f"content is not {ctype}")
+                    size += len(chunk)
+                    if size > IMAGE_MAX_BYTES:
+                        raise ValueError(f"image larger than {IMAGE_MAX_BYTES} bytes")
+                    f.write(chunk)
+            if size == 0:
+                raise ValueError("empty image")
+        except BaseException:
+            # never leave a partial or rejected file in the served directory
+            os.remove(path)
+            raise
+    return f"/static/uploads/{name}"
+
+
+def _ingest_images(rows: List[dict], pool: ThreadPoolExecutor) -> None:
+    remote = [r for r in rows
+              if (r.get("image_url") or "").startswith(("http://", "https://"))]
+    if not remote:
+        return
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    futures = [(r, pool.submit(_fetch_image, r["image_url"])) for r in remote]
+    for row, fut in futures:
+        try:
+            row["image_url"] = fut.result()
+        except Exception as e:
+            # keep the remote URL rather than failing the row
+            print("Catalog image error:", row["image_url"], e)
+
+
+# ─── Import ────────────────────────────────────────────────────────────────────
+
+def _write(db: Session, rows: List[dict]) -> Tuple[int, int]:
+    """Insert/update `rows` in one transaction; returns (inserted, updated)."""
+    ids = [r["id"] for r in rows if "id" in r]
+    existing = set()
+    if ids:
+        existing = {i for (i,) in db.query(Item.id).filter(Item.id.in_(ids))}
+
+    updates = [r for r in rows if r.get("id") in existing]
+    inserts = [{**dict.fromkeys(OPTIONAL_FIELDS), **r}
+               for r in rows if r.get("id") not in existing]
+    if inserts:
+        # explicit ids and autoincrement rows need separate executemany batches
+        with_id = [r for r in inserts if "id" in r]
+        without_id = [r for r in inserts if "id" not in r]
+        for batch in (with_id, without_id):
+            if batch:
+                db.execute(insert(Item.__table__), batch)
+    # one bulk UPDATE per set of columns present
+    by_cols: Dict[frozenset, List[dict]] = {}
+    for r in updates:
+        by_cols.setdefault(frozenset(r), []).append(r)
+    for batch in by_cols.values():
+        db.execute(update(Item), batch)
+    db.commit()
+    return len(inserts), len(updates)
+
+
+def _flush(db: Session, chunk: List[Tuple[int, dict]], result: ImportResult) -> None:
+    # a repeated id within the chunk: the last row wins
+    by_id: Dict[int, Tuple[int, dict]] = {}
+    rows: List[Tuple[int, dict]] = []
+    for lineno, row in chunk:
+        if "id" in row:
+            by_id[row["id"]] = (lineno, row)
+        else:
+            rows.append((lineno, row))
+    rows += by_id.values()
+
+    try:
+        counts = [_write(db, [r for _, r in rows])]
+    except (SQLAlchemyError, OverflowError):
+        db.rollback()
+        # find the bad rows rather than failing the whole chunk
+        counts = []
+        for lineno, row in rows:
+            try:
+                counts.append(_write(db, [row]))
+            except (SQLAlchemyError, OverflowError) as e:
+                db.rollback()
+                result.error(lineno, str(getattr(e, "orig", None) or e).splitlines()[0])
+    result.inserted += sum(i for i, _ in counts)
+    result.updated += sum(u for _, u in counts)
+
+
+def import_items(db: Session, rows: Iterable[Tuple[int, dict]],
+                 chunk_size: int = CHUNK_SIZE,
+                 fetch_images: bool = True) -> ImportResult:
+    """Validate and write `rows` in chunks of `chunk_size`."""
+    result = ImportResult()
+    chunk: List[Tuple[int, dict]] = []
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        def flush():
+            if fetch_images:
+                _ingest_images([row for _, row in chunk], pool)
+            _flush(db, chunk, result)
+            chunk.clear()
+
+        for lineno, raw in rows:
+            try:
+                chunk.append((lineno, _validate(raw)))
+            except (ValidationError, ValueError, TypeError) as e:
+                result.error(lineno, str(e).splitlines()[0])
+                continue
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    return result
+
+
+# ─── Export ────────────────────────────────────────────────────────────────────
+
+def iter_items(db: Session, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """Every item as a plain tuple, fetched `chunk_size` rows at a time by id."""
+    cols = [getattr(Item, f) for f in EXPORT_FIELDS]
+    last_id = 0
+    while True:
+        page = (db.query(*cols)
+                  .filter(Item.id > last_id)
+                  .order_by(Item.id)
+                  .limit(chunk_size)
+                  .all())
+        if not page:
+            return
+        yield from page
+        last_id = page[-1][0]
+
+
+def export_lines(db: Session, fmt: str = "csv",
+                 chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """CSV (with header) or JSONL text, one chunk of rows per yielded string."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+
+    n = 0
+    for row in iter_items(db, chunk_size):
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buf.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n")
+        n += 1
+        if n % chunk_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    import sys
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import/export gemstone items")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_in = sub.add_parser("import")
+    p_in.add_argument("path")
+    p_in.add_argument("--format", choices=["csv", "jsonl"])
+    p_in.add_argument("--no-images", action="store_true", help="don't download image URLs")
+    p_out = sub.add_parser("export")
+    p_out.add_argument("path", help="file to write, or - for stdout")
+    p_out.add_argument("--format", choices=["csv", "jsonl"])
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    db = SessionLocal()
+    try:
+        if args.cmd == "import":
+            with open(args.path, "rb") as f:
+                result = import_items(db, iter_rows(f, fmt), fetch_images=not args.no_images)
+            print(f"inserted={result.inserted} updated={result.updated} failed={result.failed}")
+            for err in result.errors:
+                print(f"  line {err['line']}: {err['error']}")
+        else:
+            out = sys.stdout if args.path == "-" else open(args.path, "w", newline="")
+            try:
+                for part in export_lines(db, fmt):
+                    out.write(part)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,12 @@ from sqlalchemy import create_engine, MetaData, Column, Integer, String, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import secrets
 from dotenv import load_dotenv
 from passlib.hash import bcrypt
 
+from dbrouter import SessionRouter
+
 
 load_dotenv()
 
@@ -23,4 +26,16 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Optional read replicas, comma-separated SQLAlchemy URLs
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+replica_engines = [create_engine(u, pool_pre_ping=True) for u in REPLICA_URLS]
+router = SessionRouter(
+    SessionLocal,
+    replica_engines,
+    pin_seconds=float(os.getenv("REPLICA_PIN_SECONDS", "5")),
+    retry_after=float(os.getenv("REPLICA_RETRY_SECONDS", "30")),
+    # signs the read-your-writes cookie; set it so every worker accepts the others'
+    secret=os.getenv("SESSION_SECRET") or secrets.token_hex(32),
+)
+
 
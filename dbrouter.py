@@ -0,0 +1,139 @@
+"""
+Read-replica routing.
+
+`SessionRouter.write()` always hands out a primary session. `read()` hands
+out a session on the next healthy replica (round robin), except:
+
+* the client committed something within the last `pin_seconds`: the commit
+  sets a small signed `rw_until` cookie (via `PinCookieMiddleware`, so the
+  server-side session isn't rewritten), and their reads stay on the primary
+  so they see their own writes despite replication lag;
+* every replica is unreachable: a replica that fails to connect is skipped
+  for `retry_after` seconds and reads fall back to the primary.
+
+Replica sessions refuse to flush, so a read-only dependency can't write by
+accident. With no replicas configured, both paths are just the primary.
+"""
+import hashlib
+import hmac
+import itertools
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.datastructures import MutableHeaders
+
+PIN_KEY = "rw_until"            # cookie name, and the scope key a commit sets
+
+
+class ReadOnlySessionError(RuntimeError):
+    pass
+
+
+class SessionRouter:
+    def __init__(self, primary: sessionmaker, replicas: Sequence[Engine] = (),
+                 pin_seconds: float = 5.0, retry_after: float = 30.0, secret: str = ""):
+        self.primary = primary
+        self.replicas: List[sessionmaker] = [
+            sessionmaker(bind=e, autocommit=False, autoflush=False) for e in replicas
+        ]
+        self.pin_seconds = pin_seconds
+        self.retry_after = retry_after
+        self._secret = secret.encode()
+        self._down_until: Dict[int, float] = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+        event.listen(self.primary, "after_commit", self._after_commit)
+        for maker in self.replicas:
+            event.listen(maker, "before_flush", self._refuse_flush)
+
+    # ─── Hooks ────────────────────────────────────────────────────────────────
+
+    def _after_commit(self, session: Session) -> None:
+        conn = session.info.get("conn")
+        if conn is not None and self.replicas:
+            # PinCookieMiddleware turns this into the cookie on the response
+            conn.scope[PIN_KEY] = time.time() + self.pin_seconds
+
+    @staticmethod
+    def _refuse_flush(session: Session, *args: Any) -> None:
+        if session.new or session.dirty or session.deleted:
+            raise ReadOnlySessionError("write attempted on a read replica session")
+
+    # ─── Sessions ─────────────────────────────────────────────────────────────
+
+    def write(self, conn: Optional[Any] = None) -> Session:
+        """Primary session; commits pin `conn` (a Request/WebSocket) to the primary."""
+        db = self.primary()
+        db.info["conn"] = conn
+        return db
+
+    def read(self, conn: Optional[Any] = None) -> Session:
+        if not self.replicas or self.pinned(conn):
+            return self.primary()
+
+        now = time.time()
+        start = next(self._next)
+        for step in range(len(self.replicas)):
+            i = (start + step) % len(self.replicas)
+            if self._down_until.get(i, 0) > now:
+                continue
+            db = self.replicas[i]()
+            try:
+                db.connection()             # check out now so failures surface here
+                return db
+            except DBAPIError as e:
+                db.close()
+                with self._lock:
+                    self._down_until[i] = now + self.retry_after
+                print(f"Replica {i} unavailable, using primary:", e)
+        return self.primary()
+
+    # ─── Pin cookie ───────────────────────────────────────────────────────────
+
+    def _sign(self, value: str) -> str:
+        return hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def pin_cookie(self, until: float) -> str:
+        value = f"{until:.3f}"
+        return f"{value}.{self._sign(value)}"
+
+    def pinned(self, conn: Optional[Any]) -> bool:
+        if conn is None:
+            return False
+        now = time.time()
+        if conn.scope.get(PIN_KEY, 0) > now:           # wrote earlier in this request
+            return True
+        value, _, sig = (conn.cookies.get(PIN_KEY) or "").rpartition(".")
+        if not value or not hmac.compare_digest(sig, self._sign(value)):
+            return False
+        return float(value) > now
+
+
+class PinCookieMiddleware:
+    """Sends the `rw_until` cookie for responses whose request committed."""
+
+    def __init__(self, app, router: SessionRouter, https_only: bool = False):
+        self.app = app
+        self.router = router
+        self.flags = "path=/; httponly; samesite=lax" + ("; secure" if https_only else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            until = scope.get(PIN_KEY)
+            if message["type"] == "http.response.start" and until:
+                cookie = (f"{PIN_KEY}={self.router.pin_cookie(until)}; {self.flags}; "
+                          f"Max-Age={math.ceil(self.router.pin_seconds)}")
+                MutableHeaders(scope=message).append("Set-Cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
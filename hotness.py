@@ -0,0 +1,144 @@
+"""
+Activity-ranked "hot items".
+
+Each bid or item view adds `weight * exp(-(now - t) / tau)` to an item's
+score. Instead of decaying every score on every tick we store
+
+    log(score) + now / tau  ==  log( sum(weight * exp(t / tau)) )
+
+which only ever grows and ranks items exactly like the decayed score
+does at any fixed moment. So updates are O(log n) on one item, ordering
+never goes stale, and the top list can be kept as a small sorted array.
+
+Scores live in memory and are snapshotted to `item_hotness` periodically;
+on startup the snapshot is reloaded (or seeded once from recent bids).
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from models import Bid, ItemHotness
+
+HALF_LIFE_HOURS = float(os.getenv("HOT_HALF_LIFE_HOURS", "6"))
+BID_WEIGHT      = float(os.getenv("HOT_BID_WEIGHT", "5"))
+VIEW_WEIGHT     = float(os.getenv("HOT_VIEW_WEIGHT", "1"))
+TOP_CAPACITY    = 64
+
+
+class HotnessRanker:
+    def __init__(self, half_life: float = HALF_LIFE_HOURS * 3600,
+                 capacity: int = TOP_CAPACITY):
+        self.tau = half_life / math.log(2)
+        self.capacity = capacity
+        self._scores: Dict[int, float] = {}
+        # ascending (score, item_id); only the `capacity` best items
+        self._top: List[Tuple[float, int]] = []
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+
+    # ─── Updates ──────────────────────────────────────────────────────────────
+
+    def record(self, item_id: int, weight: float, at: Optional[float] = None) -> None:
+        x = math.log(weight) + (time.time() if at is None else at) / self.tau
+        with self._lock:
+            old = self._scores.get(item_id)
+            if old is None:
+                new = x
+            else:
+                # log(exp(old) + exp(x)) without overflow
+                hi, lo = (old, x) if old > x else (x, old)
+                new = hi + math.log1p(math.exp(lo - hi))
+            self._set(item_id, old, new)
+            self._dirty.add(item_id)
+
+    def record_bid(self, item_id: int, at: Optional[float] = None) -> None:
+        self.record(item_id, BID_WEIGHT, at)
+
+    def record_view(self, item_id: int, at: Optional[float] = None) -> None:
+        self.record(item_id, VIEW_WEIGHT, at)
+
+    def _set(self, item_id: int, old: Optional[float], new: float) -> None:
+        self._scores[item_id] = new
+        if old is not None:
+            i = bisect.bisect_left(self._top, (old, item_id))
+            if i < len(self._top) and self._top[i] == (old, item_id):
+                del self._top[i]
+        # scores never drop, so an item can only enter the top on its own update
+        if len(self._top) < self.capacity or new > self._top[0][0]:
+            bisect.insort(self._top, (new, item_id))
+            if len(self._top) > self.capacity:
+                del self._top[0]
+
+    def forget(self, item_id: int) -> None:
+        with self._lock:
+            if self._scores.pop(item_id, None) is None:
+                return
+            self._dirty.discard(item_id)
+            self._top = [e for e in self._top if e[1] != item_id]
+            if len(self._scores) > len(self._top):
+                # something outside the top may now belong in it
+                self._top = sorted((s, i) for i, s in self._scores.items())[-self.capacity:]
+
+    # ─── Reads ────────────────────────────────────────────────────────────────
+
+    def top(self, k: int) -> List[int]:
+        """Ids of the k hottest items, hottest first."""
+        with self._lock:
+            return [item_id for _, item_id in self._top[:-k - 1:-1]] if k > 0 else []
+
+    def score(self, item_id: int, at: Optional[float] = None) -> float:
+        """Current decayed score (for display/debugging)."""
+        s = self._scores.get(item_id)
+        if s is None:
+            return 0.0
+        return math.exp(s - (time.time() if at is None else at) / self.tau)
+
+    # ─── Persistence ──────────────────────────────────────────────────────────
+
+    def load(self, db: Session, seed_days: float = 7) -> None:
+        rows = db.query(ItemHotness.item_id, ItemHotness.score).all()
+        if rows:
+            with self._lock:
+                for item_id, s in rows:
+                    self._set(item_id, self._scores.get(item_id), s)
+            return
+        # first run: seed from recent bids once, then the snapshot takes over
+        since = datetime.utcnow() - timedelta(days=seed_days)
+        for item_id, ts in db.query(Bid.item_id, Bid.timestamp).filter(Bid.timestamp >= since):
+            self.record_bid(item_id, ts.replace(tzinfo=timezone.utc).timestamp())
+
+    def snapshot(self, db: Session) -> int:
+        """Write scores changed since the last snapshot; returns rows written."""
+        with self._lock:
+            dirty = {i: self._scores[i] for i in self._dirty if i in self._scores}
+            self._dirty.clear()
+        if not dirty:
+            return 0
+        try:
+            now = datetime.utcnow()
+            existing = {i for (i,) in db.query(ItemHotness.item_id)
+                                         .filter(ItemHotness.item_id.in_(list(dirty)))}
+            rows = [{"item_id": i, "score": s, "updated_at": now} for i, s in dirty.items()]
+            inserts = [r for r in rows if r["item_id"] not in existing]
+            updates = [r for r in rows if r["item_id"] in existing]
+            if inserts:
+                db.execute(insert(ItemHotness.__table__), inserts)
+            if updates:
+                db.execute(update(ItemHotness), updates)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+        return len(dirty)
+
+
+ranker = HotnessRanker()
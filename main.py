@@ -1,7 +1,10 @@
 # ─── Standard library ──────────────────────────────────────────────────────────
+import asyncio
+import json
 import os
 import shutil
 import secrets
+import time
 from datetime import datetime
 from sqlalchemy import select
 # near the top of main.py
@@ -34,27 +37,40 @@ from fastapi import (
     File,
     HTTPException,
     Body,
+    BackgroundTasks,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 # ─── Templating & Sessions (Starlette) ────────────────────────────────────────
 from starlette.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
 
 # ─── External APIs ─────────────────────────────────────────────────────────────
 from openai import OpenAI
 import stripe
 
 # ─── Your local modules ────────────────────────────────────────────────────────
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, Base, router as db_router
+from dbrouter import PinCookieMiddleware
 from models import Item, User
 from schemas import SEOSuggestionRequest, ChatMessage
+from ratelimit import InboundQueue, bid_limiter, chat_limiter, INBOUND_QUEUE_SIZE
+from archive import archive_old_messages, archived_rooms, load_history, valid_room
+import catalog
+from hotness import ranker
+import analytics
+import auctions
+from auctions import scheduler as auction_scheduler
+import frames
+from recommend import recommender
+from notify import hub as notify_hub
+import profiling
+import sessions
 from starlette.websockets import WebSocket, WebSocketDisconnect
+from starlette.requests import HTTPConnection
 from typing import Dict, List
 import secrets
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import Jinja2Templates
 # ─── (Optional) Flask, if you still need it ────────────────────────────────────
 from flask import session, render_template, request as flask_request, \
@@ -70,9 +86,36 @@ app = FastAPI()
 SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
 JWT_SECRET     = os.getenv("JWT_SECRET")     or secrets.token_hex(32)
 
+async def _profile_allowed(scope) -> bool:
+    # only reached for requests that ask to be profiled
+    user_id = scope.get("session", {}).get("user_id")
+    if not user_id:
+        return False
+    user = await asyncio.to_thread(_with_db, lambda db: db.get(User, user_id))
+    return bool(user and user.is_admin)
+
+# inside the session middleware (added first = innermost) so it can see the session
+app.add_middleware(
+    profiling.ProfilerMiddleware,
+    reports=profiling.reports,
+    sampler=profiling.sampler,
+    is_admin=_profile_allowed,
+)
+
+# request.session lives server-side; the cookie only carries its id
+session_store = sessions.make_store(sessions.BACKEND, SessionLocal)
+app.add_middleware(
+    sessions.ServerSessionMiddleware,
+    store=session_store,
+    https_only=os.getenv("SESSION_HTTPS_ONLY", "0") == "1",
+    skip_prefixes=("/static/",),
+)
+
+# sets the read-your-writes cookie after a commit (see dbrouter)
 app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.getenv("SESSION_SECRET", "fallback_secret")  
+    PinCookieMiddleware,
+    router=db_router,
+    https_only=os.getenv("SESSION_HTTPS_ONLY", "0") == "1",
 )
 
 app.add_middleware(
@@ -124,12 +167,17 @@ class ConnectionManager:
     def __init__(self):
         # maps room name → list of websockets
         self.active: Dict[str, List[WebSocket]] = {}
+        # id(websocket) → frame encoding, for clients that asked for non-JSON
+        self.encoding: Dict[int, str] = {}
 
-    async def connect(self, room: str, ws: WebSocket):
+    async def connect(self, room: str, ws: WebSocket, encoding: str = "json"):
         await ws.accept()
         self.active.setdefault(room, []).append(ws)
+        if encoding != "json":
+            self.encoding[id(ws)] = encoding
 
     def disconnect(self, room: str, ws: WebSocket):
+        self.encoding.pop(id(ws), None)
         conns = self.active.get(room, [])
         if ws in conns:
             conns.remove(ws)
@@ -137,19 +185,195 @@ class ConnectionManager:
                 del self.active[room]
 
     async def broadcast(self, room: str, message: dict):
-        for ws in self.active.get(room, []):
+        # encode once per encoding, not once per viewer
+        payloads = {}
+        for ws in list(self.active.get(room, [])):
+            enc = self.encoding.get(id(ws), "json")
+            if enc not in payloads:
+                payloads[enc] = frames.encode(message, enc)
             try:
-                await ws.send_json(message)
+                if enc == "json":
+                    await ws.send_text(payloads[enc])
+                else:
+                    await ws.send_bytes(payloads[enc])
             except:
                 pass
 
 auction_mgr = ConnectionManager()
 chat_mgr    = ConnectionManager()
+# batches new_bid frames per room when AUCTION_TICK_MS > 0
+bid_coalescer = frames.BidCoalescer(auction_mgr.broadcast)
+
+# background jobs get their own short-lived session
+def _with_db(fn):
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+# ──────────────── CHAT ARCHIVAL ────────────────
+
+CHAT_HISTORY_PAGE      = int(os.getenv("CHAT_HISTORY_PAGE", "50"))
+CHAT_ARCHIVE_INTERVAL  = float(os.getenv("CHAT_ARCHIVE_INTERVAL", "3600"))  # seconds, 0 = off
+
+async def _archive_loop():
+    while True:
+        try:
+            await asyncio.to_thread(_with_db, archive_old_messages)
+        except Exception as e:
+            print("Chat archive error:", e)
+        await asyncio.sleep(CHAT_ARCHIVE_INTERVAL)
+
+@app.on_event("startup")
+async def start_chat_archiver():
+    if CHAT_ARCHIVE_INTERVAL > 0:
+        app.state.chat_archiver = asyncio.create_task(_archive_loop())
+
+# ──────────────── HOT ITEMS ────────────────
+
+HOT_SNAPSHOT_INTERVAL = float(os.getenv("HOT_SNAPSHOT_INTERVAL", "60"))  # seconds
+
+async def _hotness_loop():
+    while True:
+        await asyncio.sleep(HOT_SNAPSHOT_INTERVAL)
+        try:
+            await asyncio.to_thread(_with_db, ranker.snapshot)
+        except Exception as e:
+            print("Hotness snapshot error:", e)
+
+@app.on_event("startup")
+async def start_hotness():
+    try:
+        await asyncio.to_thread(_with_db, ranker.load)
+    except Exception as e:
+        print("Hotness load error:", e)
+    app.state.hotness_snapshots = asyncio.create_task(_hotness_loop())
+
+@app.on_event("startup")
+async def start_recommender():
+    try:
+        await asyncio.to_thread(_with_db, recommender.load)
+    except Exception as e:
+        print("Recommender load error:", e)
+
+@app.on_event("shutdown")
+async def stop_hotness():
+    try:
+        await asyncio.to_thread(_with_db, ranker.snapshot)
+    except Exception as e:
+        print("Hotness snapshot error:", e)
+
+# ──────────────── AUCTION SCHEDULER ────────────────
+
+def _close_auction(db, item_id):
+    won = auctions.close_auction(db, item_id)
+    return (won.user_id, won.user.username, won.amount) if won else (None, None, None)
+
+async def _auction_started(item_id: int):
+    await asyncio.to_thread(_with_db, lambda db: auctions.open_auction(db, item_id))
+    await bid_coalescer.send(f"auction_{item_id}", {"type": "auction_start"})
+
+async def _auction_closed(item_id: int):
+    winner_id, winner, amount = await asyncio.to_thread(_with_db, lambda db: _close_auction(db, item_id))
+    if winner_id:
+        notify_hub.emit(winner_id, "won", item_id=item_id, amount=amount)
+    # after the winning bid's frame, even if it is still waiting for a tick
+    await bid_coalescer.send(f"auction_{item_id}", {
+        "type":   "auction_closed",
+        "winner": winner,
+        "amount": amount,
+    })
+
+auction_scheduler.on_start = _auction_started
+auction_scheduler.on_close = _auction_closed
+
+@app.on_event("startup")
+async def start_auction_scheduler():
+    try:
+        await asyncio.to_thread(_with_db, lambda db: auctions.load_schedule(db, auction_scheduler))
+    except Exception as e:
+        print("Auction schedule load error:", e)
+    app.state.auction_scheduler = asyncio.create_task(auction_scheduler.run())
+    if bid_coalescer.enabled:
+        app.state.bid_coalescer = asyncio.create_task(bid_coalescer.run())
+
+# ──────────────── SESSIONS ────────────────
+
+async def _session_sweep_loop():
+    while True:
+        await asyncio.sleep(sessions.SWEEP_INTERVAL)
+        try:
+            await sessions.call(session_store, session_store.expire, time.time())
+        except Exception as e:
+            print("Session sweep error:", e)
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    app.state.session_sweeper = asyncio.create_task(_session_sweep_loop())
+
+# ──────────────── NOTIFICATIONS ────────────────
+
+NOTIFY_FLUSH_INTERVAL = float(os.getenv("NOTIFY_FLUSH_INTERVAL", "2"))
+
+async def _notify_loop():
+    while True:
+        await asyncio.sleep(NOTIFY_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(_with_db, notify_hub.flush)
+            # rows other workers flushed: push them to this worker's open streams
+            for user_id, note in await asyncio.to_thread(_with_db, notify_hub.sync):
+                notify_hub.publish(user_id, note)
+        except Exception as e:
+            print("Notification flush error:", e)
+
+@app.on_event("startup")
+async def start_notifications():
+    app.state.notify_flusher = asyncio.create_task(_notify_loop())
+
+@app.on_event("shutdown")
+async def stop_notifications():
+    try:
+        await asyncio.to_thread(_with_db, notify_hub.flush)
+    except Exception as e:
+        print("Notification flush error:", e)
+
+# ──────────────── ANALYTICS ────────────────
+
+async def _analytics_loop():
+    while True:
+        await asyncio.sleep(analytics.FLUSH_INTERVAL)
+        if not len(analytics.events):
+            continue
+        try:
+            await asyncio.to_thread(_with_db, analytics.events.flush)
+        except Exception as e:
+            print("Analytics flush error:", e)
+
+@app.on_event("startup")
+async def start_analytics():
+    app.state.analytics_flusher = asyncio.create_task(_analytics_loop())
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    try:
+        await asyncio.to_thread(_with_db, analytics.events.flush)
+    except Exception as e:
+        print("Analytics flush error:", e)
 
 # ──────────────── UTILS ────────────────
 
-def get_db():
-    db = SessionLocal()
+def get_db(conn: HTTPConnection):
+    # primary; a commit pins this client's reads to the primary for a few seconds
+    db = db_router.write(conn)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(conn: HTTPConnection):
+    # replica when one is healthy and the client hasn't just written
+    db = db_router.read(conn)
     try:
         yield db
     finally:
@@ -161,19 +385,34 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         return db.query(User).filter_by(id=user_id).first()
     return None
 
+def _inbox(user_id: int):
+    # served from memory; the one load per user per process reads the primary,
+    # so notifications that haven't replicated yet aren't cached as missing
+    if notify_hub.cached(user_id):
+        return notify_hub.inbox(user_id)
+    return _with_db(lambda db: notify_hub.inbox(user_id, db))
+
+def user_notifications(user):
+    return _inbox(user.id) if user else []
+
 # ──────────────── ROUTES ────────────────
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, db: Session = Depends(get_db)):
+def home(request: Request, db: Session = Depends(get_read_db)):
     items = db.query(Item).all()
     user = get_current_user(request, db)
 
       # ─── New: fetch the newest (latest) item and the top 4 “hot” items ───
-    latest_item = db.query(Item).order_by(Item.id.desc()).first()
-    hot_items   = db.query(Item).order_by(Item.id.desc()).limit(4).all()
+    latest_item = max(items, key=lambda i: i.id, default=None)
+    # hot = ranked by recent bids/views in memory; newest items fill any gaps
+    by_id       = {i.id: i for i in items}
+    hot_items   = [by_id[i] for i in ranker.top(4) if i in by_id]
+    if len(hot_items) < 4:
+        hot_items += [i for i in sorted(items, key=lambda i: i.id, reverse=True)
+                      if i not in hot_items][:4 - len(hot_items)]
 
     # ─── ADDED: prepare notifications & tour prompt ───
-    notifications = []
+    notifications = user_notifications(user)
     show_tour_prompt = False
     if not user and not request.session.get("tour_prompt_shown", False):
         show_tour_prompt = True
@@ -195,7 +434,7 @@ def home(request: Request, db: Session = Depends(get_db)):
 @app.get("/signup", response_class=HTMLResponse)
 def signup_page(request: Request, db: Session = Depends(get_db)):   # ─── ADDED db
     user = get_current_user(request, db)                            # ─── ADDED
-    notifications = []                                              # ─── ADDED
+    notifications = user_notifications(user)                        # ─── ADDED
     return templates.TemplateResponse("index.html", {
         "request": request,
         "user": user,                                               # ─── ADDED
@@ -236,7 +475,7 @@ def signup(
 @app.get("/login", response_class=HTMLResponse)
 def login_page(request: Request, db: Session = Depends(get_db)):    # ─── ADDED db
     user = get_current_user(request, db)                            # ─── ADDED
-    notifications = []                                              # ─── ADDED
+    notifications = user_notifications(user)                        # ─── ADDED
     return templates.TemplateResponse("index.html", {
         "request": request,
         "user": user,                                               # ─── ADDED
@@ -268,7 +507,7 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
         return RedirectResponse("/login", status_code=303)
 
     # ─── ADDED
-    notifications = []
+    notifications = user_notifications(user)
 
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -281,13 +520,14 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
 @app.get("/admin/chats", response_class=HTMLResponse)
 def admin_chats(
     request: Request,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
 ):
+    user = get_current_user(request, db)
     if not user or not user.is_admin:
         raise HTTPException(403, "Not authorized")
-    # Grab every distinct room name from your messages table
+    # Grab every distinct room name from your messages table (+ archived rooms)
     rooms = [r[0] for r in db.query(Message.room).distinct().all()]
+    rooms += [r for r in archived_rooms() if r not in rooms]
     return templates.TemplateResponse("admin_chats.html", {
         "request": request,
         "rooms": rooms,
@@ -297,6 +537,7 @@ async def ws_auction(
     websocket: WebSocket,
     item_id: int,
     token: str = Query(...),                    # your auth token
+    enc: str = Query("json"),                   # "json" or "msgpack" for bid frames
     db: Session = Depends(get_db),
 ):
     # 1) Authenticate
@@ -306,50 +547,91 @@ async def ws_auction(
         return
 
     room = f"auction_{item_id}"
-    await auction_mgr.connect(room, websocket)
+    encoding = frames.negotiate(enc)
+    await auction_mgr.connect(room, websocket, encoding)
 
+    # rate-limited per user+room; frames over the limit never reach the DB
+    inbound = InboundQueue(websocket, bid_limiter, f"{user.id}:{room}", INBOUND_QUEUE_SIZE)
     try:
         # On connect, send the current highest bid
-        highest = db.query(Bid).filter_by(item_id=item_id).order_by(Bid.amount.desc()).first()
+        highest = auctions.highest_bid(db, item_id)
+        ends_at = auction_scheduler.ends_at(item_id)
         await websocket.send_json({
             "type": "init",
-            "highest": highest.amount if highest else 0
+            "highest": highest.amount if highest else 0,
+            "ends_at": auctions.from_epoch(ends_at).isoformat() if ends_at else None,
+            "enc": encoding,
+            "tick_ms": frames.TICK_MS,
         })
 
+        inbound.start()
         while True:
-            data = await websocket.receive_json()
+            data = await inbound.receive()
             # { "bid": 123.45 }
             new_bid = float(data.get("bid", 0))
-            # re-load highest
-            curr = db.query(Bid).filter_by(item_id=item_id).order_by(Bid.amount.desc()).first()
+            # timed auctions only take bids between start and (extended) end
+            if not auction_scheduler.accepts_bids(item_id):
+                await websocket.send_json({"type":"error","msg":"Auction is not open"})
+                continue
+            # re-load highest (of this run, not earlier ones)
+            curr = auctions.highest_bid(db, item_id)
             curr_amt = curr.amount if curr else 0
             if new_bid <= curr_amt:
                 await websocket.send_json({"type":"error","msg":"Bid too low","highest":curr_amt})
                 continue
 
             # save new bid
+            outbid_user = curr.user_id if curr and curr.user_id != user.id else None
             bid = Bid(item_id=item_id, user_id=user.id, amount=new_bid)
             db.add(bid); db.commit()
-
-            # broadcast to everyone in this auction room
-            await auction_mgr.broadcast(room, {
+            if outbid_user:
+                notify_hub.emit(outbid_user, "outbid", item_id=item_id,
+                                amount=new_bid, by=user.username)
+            ranker.record_bid(item_id)
+            recommender.record_bid(user.id, item_id)
+
+            # anti-sniping: a late bid pushes the close out
+            new_end = auction_scheduler.bid_placed(item_id)
+            if new_end:
+                db.query(Item).filter_by(id=item_id).update(
+                    {"auction_end": auctions.from_epoch(new_end)})
+                db.commit()
+
+            # broadcast to everyone in this auction room (or queue for the next tick)
+            frame = {
                 "type": "new_bid",
                 "user": user.username,
                 "amount": new_bid,
                 "timestamp": bid.timestamp.isoformat()
-            })
+            }
+            if bid_coalescer.enabled:
+                bid_coalescer.push(room, frame)
+            else:
+                await auction_mgr.broadcast(room, frame)
+            if new_end:
+                # after the bid that caused it
+                await bid_coalescer.send(room, {
+                    "type": "extended",
+                    "ends_at": auctions.from_epoch(new_end).isoformat(),
+                })
 
     except WebSocketDisconnect:
         auction_mgr.disconnect(room, websocket)
+    finally:
+        await inbound.close()
 
 
 @app.get("/auction/{item_id}", response_class=HTMLResponse)
 def auction_page(request: Request, item_id: int, db: Session = Depends(get_db)):
     user = get_current_user(request, db)
     item = db.query(Item).get(item_id)
+    if item:
+        ranker.record_view(item_id)
+        analytics.track("view", item_id, user.id if user else None)
     return templates.TemplateResponse("auction.html", {
       "request": request,
       "item": item,
+      "similar": recommender.similar_items([item_id]) if item else [],
       "user_token": create_jwt_for(user)   # or however you auth
     })
 
@@ -360,20 +642,20 @@ async def ws_chat(websocket: WebSocket, room: str, token: str = Query(...), db:
     if not user:
         await websocket.close(code=4001)
         return
+    if not valid_room(room):
+        await websocket.close(code=4004)
+        return
 
     await chat_mgr.connect(room, websocket)
+    inbound = InboundQueue(websocket, chat_limiter, f"{user.id}:{room}", INBOUND_QUEUE_SIZE)
     try:
-        # send past history
-        history = db.query(Message).filter_by(room=room).order_by(Message.timestamp).all()
-        for m in history:
-            await websocket.send_json({
-                "sender": m.sender.username,
-                "content": m.content,
-                "ts": m.timestamp.isoformat()
-            })
+        # send the latest page of history; older pages come from /chat/{room}/history
+        for frame in load_history(db, room, limit=CHAT_HISTORY_PAGE):
+            await websocket.send_json(frame)
 
+        inbound.start()
         while True:
-            data = await websocket.receive_json()       # data is a dict
+            data = await inbound.receive()              # data is a dict
             text = data.get("content")                  # <-- use dict key
             if not text:
                 continue
@@ -392,6 +674,8 @@ async def ws_chat(websocket: WebSocket, room: str, token: str = Query(...), db:
 
     except WebSocketDisconnect:
         chat_mgr.disconnect(room, websocket)
+    finally:
+        await inbound.close()
 
 
 
@@ -403,6 +687,8 @@ def chat_page(request: Request, room: str, db: Session = Depends(get_db)):
         # send them to login if they tried to open chat without being authenticated
         return RedirectResponse("/login", status_code=303)
     # ─────────────────────────────────────────────────────────────
+    if not valid_room(room):
+        raise HTTPException(404, "No such room")
     token = create_jwt_for(user)
     return templates.TemplateResponse("chat.html", {
       "request":   request,
@@ -410,13 +696,73 @@ def chat_page(request: Request, room: str, db: Session = Depends(get_db)):
       "user_token": token
     })
 
+@app.get("/chat/{room}/history")
+def chat_history(
+    request: Request,
+    room: str,
+    before: Optional[datetime] = None,
+    limit: int = Query(CHAT_HISTORY_PAGE, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    user = get_current_user(request, db)
+    if not user:
+        raise HTTPException(401, "Login required")
+    if not valid_room(room):
+        raise HTTPException(404, "No such room")
+    # live table first, then the archive once it runs out
+    return {"messages": load_history(db, room, before=before, limit=limit)}
+
+@app.get("/notifications")
+def notifications_list(request: Request):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(401, "Login required")
+    items = _inbox(user_id)
+    return {"unread": sum(not n["read"] for n in items), "items": items}
+
+@app.post("/notifications/read")
+def notifications_read(request: Request):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(401, "Login required")
+    notify_hub.mark_read(user_id)
+    return {"ok": True}
+
+@app.get("/notifications/stream")
+async def notifications_stream(request: Request):
+    # one Server-Sent Events channel per tab; no DB access at all
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(401, "Login required")
+
+    async def events():
+        q = notify_hub.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    note = await asyncio.wait_for(q.get(), 15)
+                    yield f"data: {json.dumps(note)}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            notify_hub.unsubscribe(user_id, q)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 @app.post("/add-to-cart")
 async def add_to_cart(request: Request):
     data = await request.json()
-    item_id = int(data["item_id"])
+    try:
+        item_id = int(data["item_id"])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise HTTPException(400, "item_id must be an integer")
+    if not 0 < item_id <= analytics.MAX_ID:
+        raise HTTPException(400, "Unknown item")
     cart = request.session.get("cart", [])
     cart.append(item_id)
     request.session["cart"] = cart
+    analytics.track("cart", item_id, request.session.get("user_id"))
     return {"count": len(cart)}
 
 @app.get("/cart", response_class=HTMLResponse)
@@ -431,15 +777,16 @@ async def cart(request: Request, db: Session = Depends(get_db)):
         "user": user,
         "items": items,
         "total": total,
+        "recommendations": recommender.similar_items(ids),
         "stripe_pub": STRIPE_PUB,
         "show_tour_prompt": False,
-        "notifications": [],
+        "notifications": user_notifications(user),
         "current_year": datetime.now().year
     })
 from fastapi.responses import JSONResponse
 
 @app.get("/cart-data")
-def cart_data(request: Request, db: Session = Depends(get_db)):
+def cart_data(request: Request, db: Session = Depends(get_read_db)):
     ids = request.session.get("cart", [])
     items = db.query(Item).filter(Item.id.in_(ids)).all()
     total = sum(i.price for i in items)
@@ -494,7 +841,7 @@ async def success(request: Request, db: Session = Depends(get_db)):
         "page": "success",
         "user": user,
         "show_tour_prompt": False,
-        "notifications": [],
+        "notifications": user_notifications(user),
         "current_year": datetime.now().year
     })
 @app.get("/checkout", response_class=HTMLResponse)
@@ -529,7 +876,7 @@ def profile(request: Request, db: Session = Depends(get_db)):
         return RedirectResponse("/login", status_code=303)
 
     # ─── ADDED
-    notifications = []
+    notifications = user_notifications(user)
 
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -552,7 +899,7 @@ def admin_add_page(request: Request, db: Session = Depends(get_db)):
         return RedirectResponse("/", status_code=303)
 
     # ─── ADDED
-    notifications = []
+    notifications = user_notifications(user)
 
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -586,8 +933,77 @@ def admin_add_item(
     item = Item(name=name, description=description, price=price, image_url=image_url)
     db.add(item)
     db.commit()
+    recommender.add_item(item)
     return RedirectResponse("/", status_code=303)
 
+# ──────────────── BULK CATALOG ────────────────
+
+@app.get("/admin/items", response_class=HTMLResponse)
+def admin_items(
+    request: Request,
+    after: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    user = get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(403)
+    # keyset page instead of rendering the whole catalog
+    items = db.query(Item).filter(Item.id > after).order_by(Item.id).limit(limit).all()
+    next_after = items[-1].id if len(items) == limit else None
+    return templates.TemplateResponse("admin_items.html", {
+        "request": request,
+        "items": items,
+        "next_after": next_after,
+        "limit": limit,
+    })
+
+@app.post("/admin/items/import")
+def admin_items_import(
+    request: Request,
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    fetch_images: bool = Form(True),
+    db: Session = Depends(get_db),
+):
+    user = get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(403)
+    fmt = catalog.detect_format(file.filename or "")
+    result = catalog.import_items(db, catalog.iter_rows(file.file, fmt), fetch_images=fetch_images)
+    if result.inserted or result.updated:
+        # new vocabulary, so rebuild rather than append; after the response is sent
+        background.add_task(_with_db, recommender.load)
+    return JSONResponse({
+        "inserted": result.inserted,
+        "updated":  result.updated,
+        "failed":   result.failed,
+        "errors":   result.errors,
+    })
+
+@app.get("/admin/items/export")
+def admin_items_export(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|jsonl)$"),
+    db: Session = Depends(get_db),
+):
+    user = get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(403)
+
+    def stream():
+        # the request's session is closed before the body streams, so use our own
+        export_db = SessionLocal()
+        try:
+            yield from catalog.export_lines(export_db, format)
+        finally:
+            export_db.close()
+
+    media = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media, headers={
+        "Content-Disposition": f'attachment; filename="items.{format}"',
+    })
+
 # ──────────────── SEO SUGGESTION ────────────────
 
 @app.post("/admin/suggest-seo")
@@ -658,19 +1074,45 @@ def auction_admin_save(
     auction_live: Optional[bool]      = Form(False),
     youtube_channel: Optional[str]    = Form(None),
     fallback_image: Optional[str]     = Form(None),
+    auction_start: Optional[datetime] = Form(None),   # UTC
+    auction_end: Optional[datetime]   = Form(None),   # UTC
+    clear_schedule: bool              = Form(False),
     db: Session                       = Depends(get_db),
 ):
     user = get_current_user(request, db)
     if not user or not user.is_admin:
         raise HTTPException(403)
+    now = datetime.utcnow()
+    if auction_end and (auction_start or now) >= auction_end:
+        raise HTTPException(400, "Auction end must be in the future and after its start")
     item = db.query(Item).get(item_id)
-    item.auction_live    = bool(auction_live)
     item.youtube_channel = youtube_channel or None
     item.fallback_image  = fallback_image or None
+    if auction_end:
+        # timed auction: the scheduler opens it at the start and closes it at the end;
+        # with no start (or one already past) it is live right away. The start is
+        # always recorded: only bids from then on count towards this run.
+        opens_now = not auction_start or auction_start <= now
+        item.auction_start = auction_start or now
+        item.auction_end   = auction_end
+        item.winner_id     = None
+        item.auction_live  = opens_now
+    elif clear_schedule or item.auction_end is None:
+        # a form without times leaves an existing schedule alone unless asked
+        item.auction_start = item.auction_end = None
+        item.auction_live  = bool(auction_live)
     db.commit()
+    if auction_end:
+        auction_scheduler.schedule(
+            item_id,
+            None if opens_now else auctions.to_epoch(auction_start),
+            auctions.to_epoch(auction_end),
+        )
+    elif clear_schedule:
+        auction_scheduler.cancel(item_id)
     return RedirectResponse(f"/admin/auction/{item_id}", status_code=303)
 @app.get("/auctions", response_class=HTMLResponse)
-def auctions_list(request: Request, db: Session = Depends(get_db)):
+def auctions_list(request: Request, db: Session = Depends(get_read_db)):
     user = get_current_user(request, db)
     # only show items marked as live auctions
     live_items = db.query(Item).filter(Item.auction_live == True).all()
@@ -679,4 +1121,36 @@ def auctions_list(request: Request, db: Session = Depends(get_db)):
         "user":    user,
         "items":   live_items,
         "current_year": datetime.now().year
-    })
\ No newline at end of file
+    })
+
+
+# ──────────────── PROFILING ────────────────
+
+def _require_admin(request: Request, db: Session):
+    user = get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(403)
+
+@app.get("/admin/profiles")
+def admin_profiles(request: Request, db: Session = Depends(get_read_db)):
+    _require_admin(request, db)
+    return {"slow_ms": profiling.sampler.slow * 1000, "reports": profiling.reports.list()}
+
+@app.get("/admin/profiles/{report_id}")
+def admin_profile(report_id: int, request: Request, db: Session = Depends(get_read_db)):
+    _require_admin(request, db)
+    report = profiling.reports.get(report_id)
+    if not report:
+        raise HTTPException(404, "Report expired or unknown")
+    return {k: v for k, v in report.items() if k != "stacks"}
+
+@app.get("/admin/profiles/{report_id}/collapsed")
+def admin_profile_collapsed(report_id: int, request: Request, db: Session = Depends(get_read_db)):
+    # feed to flamegraph.pl, speedscope or inferno
+    _require_admin(request, db)
+    report = profiling.reports.get(report_id)
+    if not report:
+        raise HTTPException(404, "Report expired or unknown")
+    return PlainTextResponse(profiling.reports.collapsed(report), headers={
+        "Content-Disposition": f'attachment; filename="profile-{report_id}.folded"',
+    })
@@ -30,6 +30,10 @@ class Item(Base):
     auction_live     = Column(Boolean, default=False, nullable=False)
     youtube_channel  = Column(String(100), nullable=True)   # e.g. UC_xxx...
     fallback_image   = Column(String(200), nullable=True)
+    # ─── Timed auctions (driven by auctions.AuctionScheduler) ───
+    auction_start    = Column(DateTime, nullable=True)   # UTC
+    auction_end      = Column(DateTime, nullable=True)   # UTC, may be extended
+    winner_id        = Column(Integer, ForeignKey("users.id"), nullable=True)
 
 
 class User(Base):
@@ -82,3 +86,54 @@ class Message(Base):
 
     # relationship
     sender = relationship("User", back_populates="messages")
+
+
+class ItemHotness(Base):
+    __tablename__ = "item_hotness"
+
+    # snapshot of hotness.HotnessRanker; score is log-space, see hotness.py
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Event(Base):
+    __tablename__ = "events"
+
+    # append-only; written in batches by analytics.py
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)          # "view", "cart", ...
+    item_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class ItemEventCount(Base):
+    __tablename__ = "item_event_counts"
+
+    # hourly pre-aggregated counters per item and event kind
+    item_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    kind = Column(String(20), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    # persisted copy of notify.NotificationHub inboxes
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)          # "outbid", "won", ...
+    payload = Column(Text, nullable=False)             # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    read = Column(Boolean, default=False, nullable=False)
+
+
+class WebSession(Base):
+    __tablename__ = "web_sessions"
+
+    # server-side request.session for sessions.DBStore; the cookie holds only `id`
+    id = Column(String(64), primary_key=True)
+    data = Column(Text, nullable=False)                # JSON
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,225 @@
+"""
+Per-user notifications (outbid, auction won, ...).
+
+`emit()` is called from the event that causes the notification (a bid, an
+auction closing), so the work is O(affected users): it appends to that
+user's bounded in-memory inbox, pushes to any live channel they have open
+(one SSE stream per browser tab), and queues the row for a batched DB
+write. Page renders read the inbox from memory; a user's inbox is loaded
+from the DB on first use and again once it is NOTIFY_CACHE_SECONDS old.
+
+With several workers, each one also `sync()`s after flushing: rows other
+workers wrote since the last sync are pushed to this worker's live
+channels and invalidate the affected cached inboxes. Read marks made on
+another worker show up when the inbox is next reloaded.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from models import Notification
+
+INBOX_SIZE   = int(os.getenv("NOTIFY_INBOX_SIZE", "20"))
+CACHED_USERS = int(os.getenv("NOTIFY_CACHED_USERS", "10000"))
+MAX_AGE      = float(os.getenv("NOTIFY_CACHE_SECONDS", "30"))
+MAX_OWN      = 10000
+
+# (user_id, kind, payload JSON): how sync() recognises rows this worker wrote
+OwnKey = Tuple[int, str, str]
+
+
+class NotificationHub:
+    def __init__(self, inbox_size: int = INBOX_SIZE, cached_users: int = CACHED_USERS,
+                 max_age: float = MAX_AGE):
+        self.inbox_size = inbox_size
+        self.cached_users = cached_users
+        self.max_age = max_age
+        self._inboxes: "OrderedDict[int, Deque[dict]]" = OrderedDict()
+        self._loaded_at: Dict[int, float] = {}
+        self._own: "OrderedDict[OwnKey, int]" = OrderedDict()
+        self._synced_id: Optional[int] = None
+        self._channels: Dict[int, Set[asyncio.Queue]] = {}
+        self._pending: List[dict] = []          # rows waiting for flush()
+        self._read_upto: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    # ─── Producing ────────────────────────────────────────────────────────────
+
+    def emit(self, user_id: int, kind: str, **data) -> dict:
+        note = {
+            "kind": kind,
+            "data": data,
+            "created_at": datetime.utcnow().isoformat(),
+            "read": False,
+        }
+        with self._lock:
+            inbox = self._inboxes.get(user_id)
+            if inbox is not None:
+                inbox.appendleft(note)
+                self._inboxes.move_to_end(user_id)
+            self._pending.append({"user_id": user_id, **note})
+            key = (user_id, kind, json.dumps(data))
+            self._own[key] = self._own.get(key, 0) + 1
+            if len(self._own) > MAX_OWN:
+                self._own.popitem(last=False)
+        self.publish(user_id, note)
+        return note
+
+    def publish(self, user_id: int, note: dict) -> None:
+        """Push to the user's open channels; event loop only."""
+        for q in list(self._channels.get(user_id, ())):
+            try:
+                q.put_nowait(note)
+            except asyncio.QueueFull:
+                pass                            # slow tab; it still has the inbox
+
+    # ─── Reading ──────────────────────────────────────────────────────────────
+
+    def inbox(self, user_id: int, db: Optional[Session] = None) -> List[dict]:
+        """Newest first. Hits the DB when a user is first seen or their inbox is stale."""
+        with self._lock:
+            inbox = self._inboxes.get(user_id)
+            if inbox is not None and (db is None or self.cached(user_id)):
+                self._inboxes.move_to_end(user_id)
+                return list(inbox)
+        if db is None:
+            return []
+
+        rows = (db.query(Notification)
+                  .filter_by(user_id=user_id)
+                  .order_by(Notification.created_at.desc(), Notification.id.desc())
+                  .limit(self.inbox_size)
+                  .all())
+        loaded: Deque[dict] = deque(
+            ({"kind": n.kind, "data": json.loads(n.payload),
+              "created_at": n.created_at.isoformat(), "read": n.read} for n in rows),
+            maxlen=self.inbox_size,
+        )
+        with self._lock:
+            # anything emitted while we were querying is still pending: put it on top
+            for p in self._pending:
+                if p["user_id"] == user_id:
+                    loaded.appendleft({k: v for k, v in p.items() if k != "user_id"})
+            if not self.cached(user_id):
+                self._inboxes[user_id] = loaded
+                self._inboxes.move_to_end(user_id)
+                self._loaded_at[user_id] = time.monotonic()
+            inbox = self._inboxes[user_id]
+            if len(self._inboxes) > self.cached_users:
+                evicted, _ = self._inboxes.popitem(last=False)
+                self._loaded_at.pop(evicted, None)
+            return list(inbox)
+
+    def cached(self, user_id: int) -> bool:
+        """Whether the user's inbox is in memory and fresh enough to serve."""
+        loaded_at = self._loaded_at.get(user_id)
+        return (user_id in self._inboxes and loaded_at is not None
+                and time.monotonic() - loaded_at < self.max_age)
+
+    def unread(self, user_id: int, db: Optional[Session] = None) -> int:
+        return sum(1 for n in self.inbox(user_id, db) if not n["read"])
+
+    def mark_read(self, user_id: int) -> None:
+        with self._lock:
+            for note in self._inboxes.get(user_id, ()):
+                note["read"] = True
+            for p in self._pending:
+                if p["user_id"] == user_id:
+                    p["read"] = True
+            self._read_upto[user_id] = datetime.utcnow()
+
+    # ─── Live channels ────────────────────────────────────────────────────────
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._channels.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id: int, q: asyncio.Queue) -> None:
+        chans = self._channels.get(user_id)
+        if chans:
+            chans.discard(q)
+            if not chans:
+                del self._channels[user_id]
+
+    # ─── Persistence ──────────────────────────────────────────────────────────
+
+    def flush(self, db: Session) -> int:
+        """Write queued notifications and read marks in one batch."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            read_upto, self._read_upto = self._read_upto, {}
+        if not pending and not read_upto:
+            return 0
+        try:
+            if pending:
+                db.execute(insert(Notification.__table__), [
+                    {"user_id": p["user_id"], "kind": p["kind"],
+                     "payload": json.dumps(p["data"]),
+                     "created_at": datetime.fromisoformat(p["created_at"]),
+                     "read": p["read"]}
+                    for p in pending
+                ])
+            for user_id, upto in read_upto.items():
+                db.execute(update(Notification)
+                           .where(Notification.user_id == user_id,
+                                  Notification.created_at <= upto,
+                                  Notification.read.is_(False))
+                           .values(read=True))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._pending[:0] = pending
+                for user_id, upto in read_upto.items():
+                    self._read_upto.setdefault(user_id, upto)
+            raise
+        return len(pending)
+
+    def sync(self, db: Session) -> List[Tuple[int, dict]]:
+        """
+        Rows other workers flushed since the last call, as (user_id, note).
+        Their users' cached inboxes are dropped so the next read reloads;
+        the caller `publish()`es the notes on the event loop.
+        """
+        if self._synced_id is None:
+            # start from now: older rows are in inboxes loaded from here on
+            self._synced_id = db.query(func.max(Notification.id)).scalar() or 0
+            return []
+        rows = (db.query(Notification)
+                  .filter(Notification.id > self._synced_id)
+                  .order_by(Notification.id)
+                  .all())
+        if not rows:
+            return []
+        self._synced_id = rows[-1].id
+        foreign = []
+        with self._lock:
+            for n in rows:
+                key = (n.user_id, n.kind, n.payload)
+                seen = self._own.get(key, 0)
+                if seen:
+                    # one of ours coming back
+                    if seen == 1:
+                        del self._own[key]
+                    else:
+                        self._own[key] = seen - 1
+                    continue
+                self._inboxes.pop(n.user_id, None)
+                self._loaded_at.pop(n.user_id, None)
+                foreign.append((n.user_id, {
+                    "kind": n.kind, "data": json.loads(n.payload),
+                    "created_at": n.created_at.isoformat(), "read": n.read,
+                }))
+        return foreign
+
+
+hub = NotificationHub()
@@ -0,0 +1,317 @@
+"""
+Request profiling for production.
+
+Two triggers, both off the hot path:
+
+* on demand: an admin adds `?profile=1` (or an `X-Profile: 1` header) to
+  any request and that request is sampled from its first millisecond;
+* slow requests: with PROFILE_SLOW_MS > 0, a request still running after
+  that many milliseconds starts being sampled, and is kept if it finishes
+  over the threshold. Paths under PROFILE_SKIP_PATHS and event streams
+  (`text/event-stream`, open for as long as a tab is) are never slow.
+
+Sampling is done by one daemon thread reading `sys._current_frames()`
+every PROFILE_INTERVAL_MS, so the profiled code itself isn't instrumented.
+Samples are process-wide (as with py-spy): busy threads only, rooted at
+the thread name, so under concurrency other requests can show up too.
+SQL statements and their timings are attributed exactly, through a
+contextvar that follows the request into the threadpool.
+
+Finished reports go into a bounded ring (`PROFILE_REPORTS`). Their stacks
+export in collapsed format ("a;b;c 12" per line), which flamegraph.pl,
+speedscope and inferno read directly.
+
+With the feature idle, a request costs the middleware one query-string
+and header scan; SQL hooks return after a single contextvar lookup.
+"""
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_MS     = float(os.getenv("PROFILE_SLOW_MS", "0"))       # 0 = only on demand
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+MAX_REPORTS = int(os.getenv("PROFILE_REPORTS", "50"))
+MAX_SQL     = int(os.getenv("PROFILE_MAX_SQL", "200"))
+SKIP_PATHS  = tuple(p for p in os.getenv(
+    "PROFILE_SKIP_PATHS", "/static/,/notifications/stream").split(",") if p)
+MAX_DEPTH   = 64
+
+# leaf frames of a thread that is just waiting for work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+_current: contextvars.ContextVar[Optional["Capture"]] = contextvars.ContextVar(
+    "profile_capture", default=None)
+
+
+class Capture:
+    def __init__(self, method: str, path: str, forced: bool):
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.started = time.perf_counter()
+        self.started_at = datetime.utcnow()
+        self.samples: Counter = Counter()
+        self.sql: List[tuple] = []              # (statement, ms)
+        self.sql_dropped = 0
+        self.status = 0
+
+    def add_sql(self, statement: str, ms: float) -> None:
+        if len(self.sql) < MAX_SQL:
+            self.sql.append((statement, ms))
+        else:
+            self.sql_dropped += 1
+
+
+# ─── Sampler ──────────────────────────────────────────────────────────────────
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse(frame, thread_name: str) -> Optional[str]:
+    """One stack in collapsed form, root first; None for idle threads."""
+    if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+        return None
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame).replace(";", ":"))
+        frame = frame.f_back
+    names.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Samples the process while at least one capture is due for sampling."""
+
+    def __init__(self, interval_ms: float = INTERVAL_MS, slow_ms: float = SLOW_MS):
+        self.interval = interval_ms / 1000
+        self.slow = slow_ms / 1000
+        self._inflight: Dict[int, Capture] = {}
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._asleep = False            # waiting with no deadline at all
+
+    def start(self, capture: Capture) -> int:
+        key = next(self._ids)
+        with self._cond:
+            self._inflight[key] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+            # later captures turn slow after earlier ones, so the sampler only
+            # needs waking when it isn't already waiting on a deadline
+            if capture.forced or self._asleep:
+                self._cond.notify()
+        return key
+
+    def stop(self, key: int) -> None:
+        with self._cond:
+            self._inflight.pop(key, None)
+
+    def _due(self, now: float) -> tuple:
+        """Captures to sample now, and when the next one becomes due."""
+        due, next_at = [], None
+        for c in self._inflight.values():
+            if c.forced or (self.slow and now - c.started >= self.slow):
+                due.append(c)
+            elif self.slow:
+                at = c.started + self.slow
+                next_at = at if next_at is None else min(next_at, at)
+        return due, next_at
+
+    @staticmethod
+    def stacks() -> List[str]:
+        """Collapsed stacks of every busy thread but this one."""
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        out = []
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = collapse(frame, names.get(ident, f"thread-{ident}"))
+            if stack:
+                out.append(stack)
+        return out
+
+    def sample(self, captures: List[Capture]) -> None:
+        stacks = self.stacks()
+        for c in captures:
+            c.samples.update(stacks)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due, next_at = self._due(time.perf_counter())
+                if not due:
+                    # nothing to sample: sleep until a capture turns slow or is forced
+                    self._asleep = next_at is None
+                    timeout = None if next_at is None else max(0.0, next_at - time.perf_counter())
+                    self._cond.wait(timeout)
+                    self._asleep = False
+                    continue
+            # walk the stacks without the lock: start()/stop() run on every request
+            stacks = self.stacks()
+            with self._cond:
+                # a capture stopped meanwhile may already be in a report
+                live = {id(c) for c in self._inflight.values()}
+                for c in due:
+                    if id(c) in live:
+                        c.samples.update(stacks)
+            time.sleep(self.interval)
+
+
+# ─── SQL ──────────────────────────────────────────────────────────────────────
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = _current.get()
+    if capture is None:
+        return
+    starts = conn.info.get("profile_t0")
+    if starts:
+        capture.add_sql(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+
+_hooks_installed = False
+
+
+def install_sql_hooks() -> None:
+    global _hooks_installed
+    if not _hooks_installed:
+        # on the Engine class, so every engine (primary and replicas) is covered
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _hooks_installed = True
+
+
+# ─── Reports ──────────────────────────────────────────────────────────────────
+
+class ReportRing:
+    def __init__(self, maxlen: int = MAX_REPORTS):
+        self._reports: Deque[dict] = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+
+    def add(self, capture: Capture, duration_ms: float, reason: str) -> dict:
+        report = {
+            "id": next(self._ids),
+            "reason": reason,
+            "method": capture.method,
+            "path": capture.path,
+            "status": capture.status,
+            "started_at": capture.started_at.isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "sql_count": len(capture.sql) + capture.sql_dropped,
+            "sql_ms": round(sum(ms for _, ms in capture.sql), 2),
+            "sql": [{"statement": s, "ms": round(ms, 3)} for s, ms in capture.sql],
+            "samples": sum(capture.samples.values()),
+            "stacks": capture.samples,
+        }
+        self._reports.append(report)
+        return report
+
+    def list(self) -> List[dict]:
+        """Newest first, without the bulky parts."""
+        return [{k: v for k, v in r.items() if k not in ("sql", "stacks")}
+                for r in reversed(self._reports)]
+
+    def get(self, report_id: int) -> Optional[dict]:
+        for r in self._reports:
+            if r["id"] == report_id:
+                return r
+        return None
+
+    @staticmethod
+    def collapsed(report: dict) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in report["stacks"].most_common())
+
+
+# ─── Middleware ───────────────────────────────────────────────────────────────
+
+def _requested(scope) -> bool:
+    qs = scope.get("query_string", b"")
+    # cheap substring test first; parse only when it might be there
+    if b"profile=" in qs and parse_qs(qs.decode("latin-1")).get("profile") == ["1"]:
+        return True
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value == b"1"
+    return False
+
+
+def _streaming(message) -> bool:
+    for name, value in message.get("headers", ()):
+        if name.lower() == b"content-type":
+            return value.startswith(b"text/event-stream")
+    return False
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware; must sit inside SessionMiddleware so `is_admin` can
+    read the session. `is_admin(scope)` is only awaited for requests that
+    ask to be profiled.
+    """
+
+    def __init__(self, app, reports: ReportRing, sampler: Sampler,
+                 is_admin: Callable[[dict], Awaitable[bool]],
+                 skip_prefixes: Sequence[str] = SKIP_PATHS):
+        self.app = app
+        self.reports = reports
+        self.sampler = sampler
+        self.is_admin = is_admin
+        self.skip_prefixes = tuple(skip_prefixes)
+        install_sql_hooks()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = _requested(scope) and await self.is_admin(scope)
+        if not forced and (not self.sampler.slow
+                           or scope["path"].startswith(self.skip_prefixes)):
+            return await self.app(scope, receive, send)
+
+        capture = Capture(scope["method"], scope["path"], forced)
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                capture.status = message["status"]
+                if not forced and _streaming(message):
+                    # long-lived by design, not slow: stop sampling, keep no report
+                    streaming = True
+                    self.sampler.stop(key)
+            await send(message)
+
+        token = _current.set(capture)
+        key = self.sampler.start(capture)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.stop(key)
+            _current.reset(token)
+            duration = (time.perf_counter() - capture.started) * 1000
+            if forced:
+                self.reports.add(capture, duration, "requested")
+            elif not streaming and duration >= self.sampler.slow * 1000:
+                self.reports.add(capture, duration, "slow")
+
+
+reports = ReportRing()
+sampler = Sampler()
@@ -0,0 +1,220 @@
+"""
+Token-bucket rate limiting and inbound backpressure for the websocket rooms.
+
+Every bid / chat frame costs a DB round trip plus a room-wide broadcast, so
+each connection is limited per (user, room) and its unread frames are kept
+in a small bounded queue instead of piling up behind a slow handler.
+"""
+import asyncio
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:             # optional
+    aioredis = None
+
+# ─── Backends ──────────────────────────────────────────────────────────────────
+
+class BucketBackend(ABC):
+    """
+    Storage for bucket state: `MemoryBackend` per process, `RedisBackend`
+    to share limits between workers.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float,
+                   cost: float = 1.0) -> float:
+        """
+        Try to remove `cost` tokens from the bucket at `key`.
+        Returns 0.0 if allowed, otherwise seconds until enough tokens refill.
+        """
+
+
+class MemoryBackend(BucketBackend):
+    """Per-process buckets, LRU-capped so idle keys don't leak."""
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        # key → (tokens, last refill time)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float,
+                   cost: float = 1.0) -> float:
+        return self.take_now(key, rate, burst, cost, time.monotonic())
+
+    def take_now(self, key: str, rate: float, burst: float,
+                 cost: float, now: float) -> float:
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate if rate > 0 else float("inf")
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# same refill maths as MemoryBackend, atomic on the Redis server and on its clock
+_TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = t[1] + t[2] / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+elseif rate > 0 then
+  wait = (cost - tokens) / rate
+else
+  wait = -1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+
+class RedisBackend(BucketBackend):
+    """Buckets shared by every worker through one Redis (needs `redis`)."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL needs the 'redis' package")
+        self.client = aioredis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float,
+                   cost: float = 1.0) -> float:
+        # a bucket left alone until it's full again is the same as no bucket
+        ttl = math.ceil(burst / rate) + 1 if rate > 0 else 3600
+        wait = float(await self._script(keys=[self.prefix + key],
+                                        args=[rate, burst, cost, ttl]))
+        return float("inf") if wait < 0 else wait
+
+
+# ─── Limiter ───────────────────────────────────────────────────────────────────
+
+class RateLimiter:
+    """
+    `rate` tokens per second with bursts of up to `burst` frames,
+    keyed by whatever the caller passes (we use "user_id:room").
+    """
+
+    def __init__(self, rate: float, burst: float,
+                 backend: Optional[BucketBackend] = None):
+        self.rate = rate
+        self.burst = burst
+        self.backend = backend or MemoryBackend()
+
+    async def hit(self, key: str, cost: float = 1.0) -> float:
+        return await self.backend.take(key, self.rate, self.burst, cost)
+
+
+def rate_limited_frame(retry_after: float) -> dict:
+    return {
+        "type": "error",
+        "code": "rate_limited",
+        "msg": "Slow down – too many messages",
+        "retry_after": round(retry_after, 3),
+    }
+
+
+def overloaded_frame() -> dict:
+    return {
+        "type": "error",
+        "code": "overloaded",
+        "msg": "Server busy – message dropped",
+    }
+
+
+# ─── Inbound queue ─────────────────────────────────────────────────────────────
+
+class InboundQueue:
+    """
+    Reads frames off a websocket as fast as they arrive, rejects the ones
+    over the rate limit straight away and buffers at most `maxsize` accepted
+    frames for the (slower) handler. Anything past that is dropped with an
+    error frame, so a flood never delays other rooms or honest users.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, websocket: WebSocket, limiter: RateLimiter, key: str,
+                 maxsize: int = 16):
+        self.websocket = websocket
+        self.limiter = limiter
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._reader: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._reader = asyncio.create_task(self._pump())
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _pump(self) -> None:
+        try:
+            while True:
+                data = await self.websocket.receive_json()
+                wait = await self.limiter.hit(self.key)
+                if wait:
+                    await self.websocket.send_json(rate_limited_frame(wait))
+                    continue
+                try:
+                    self.queue.put_nowait(data)
+                except asyncio.QueueFull:
+                    await self.websocket.send_json(overloaded_frame())
+        except Exception:
+            # disconnects and bad frames both end the connection
+            pass
+        finally:
+            # the queue may be full; make room so the sentinel always lands
+            while self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self._CLOSED)
+
+    async def receive(self) -> dict:
+        data = await self.queue.get()
+        if data is self._CLOSED:
+            raise WebSocketDisconnect()
+        return data
+
+
+# ─── Defaults used by main.py ──────────────────────────────────────────────────
+
+# set to share limits between workers; otherwise each process counts on its own
+REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+_backend: Optional[BucketBackend] = RedisBackend(REDIS_URL) if REDIS_URL else None
+
+bid_limiter = RateLimiter(
+    rate=float(os.getenv("BID_RATE", "2")),
+    burst=float(os.getenv("BID_BURST", "5")),
+    backend=_backend,
+)
+chat_limiter = RateLimiter(
+    rate=float(os.getenv("CHAT_RATE", "1")),
+    burst=float(os.getenv("CHAT_BURST", "5")),
+    backend=_backend,
+)
+INBOUND_QUEUE_SIZE = int(os.getenv("WS_INBOUND_QUEUE", "16"))
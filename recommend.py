@@ -0,0 +1,252 @@
+"""
+"Similar gemstones" recommendations.
+
+Every item becomes one L2-normalised, sparse TF-IDF row over its name and
+description, stored as an inverted index (term → rows and weights, a
+column-major sparse matrix). Scoring an item or a whole cart only touches
+the postings of the terms it contains, so memory and work scale with the
+number of non-zero weights rather than items × vocabulary. Two boosts are
+added on top: closeness in log-price, and co-occurrence among items the
+same users bid on (from the `bids` table).
+
+Answers are cached per item (and per cart), so a page render is a dict
+lookup. The lock is only held to snapshot state and to store answers, not
+while scoring. New items are appended in place; the vocabulary and IDF
+weights are only recomputed by a full `build()` (startup, bulk import),
+which builds aside and swaps in.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Bid, Item
+
+MAX_FEATURES = int(os.getenv("RECO_MAX_FEATURES", "1024"))
+PRICE_WEIGHT = float(os.getenv("RECO_PRICE_WEIGHT", "0.3"))
+CO_WEIGHT    = float(os.getenv("RECO_CO_WEIGHT", "0.5"))
+CACHE_SIZE   = 4096
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOP = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "this", "to", "with",
+}
+
+# what build() swaps in
+_STATE = ("vocab", "idf", "postings", "vectors", "log_price", "size",
+          "row_of", "ids", "meta", "_user_items", "_co")
+
+# (columns, weights) of one row
+Vector = Tuple[np.ndarray, np.ndarray]
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOP and len(w) > 1]
+
+
+class _Postings:
+    """Rows containing one term, with their weights; grows like a list."""
+    __slots__ = ("rows", "weights", "n")
+
+    def __init__(self):
+        self.rows = np.zeros(4, dtype=np.int32)
+        self.weights = np.zeros(4, dtype=np.float32)
+        self.n = 0
+
+    def add(self, row: int, weight: float) -> None:
+        if self.n == len(self.rows):
+            # new arrays, so slices handed out by view() stay valid
+            self.rows = np.resize(self.rows, self.n * 2)
+            self.weights = np.resize(self.weights, self.n * 2)
+        self.rows[self.n] = row
+        self.weights[self.n] = weight
+        self.n += 1
+
+    def drop(self, row: int) -> None:
+        w = self.weights[:self.n]
+        w[self.rows[:self.n] == row] = 0
+
+    def view(self) -> Vector:
+        return self.rows[:self.n], self.weights[:self.n]
+
+
+class Recommender:
+    def __init__(self, max_features: int = MAX_FEATURES):
+        self.max_features = max_features
+        self.vocab: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.postings: Dict[int, _Postings] = {}       # column → rows with that term
+        self.vectors: List[Vector] = []                # row → its non-zero weights
+        self.log_price = np.zeros(0, dtype=np.float32)
+        self.size = 0                                  # rows in use
+        self.row_of: Dict[int, int] = {}               # item id → row
+        self.ids: List[int] = []                       # row → item id
+        self.meta: Dict[int, dict] = {}                # for rendering without a query
+        # co-occurrence of items bid on by the same user
+        self._user_items: Dict[int, Set[int]] = defaultdict(set)
+        self._co: Dict[int, Counter] = defaultdict(Counter)
+        self._cache: "OrderedDict[Tuple[int, ...], List[int]]" = OrderedDict()
+        self._generation = 0                           # bumped on every change
+        self._lock = threading.Lock()
+
+    # ─── Building ─────────────────────────────────────────────────────────────
+
+    def _vector(self, item) -> Vector:
+        weights: Dict[int, float] = {}
+        for term, tf in Counter(tokenize(f"{item.name} {item.description or ''}")).items():
+            col = self.vocab.get(term)
+            if col is not None:
+                weights[col] = (1 + math.log(tf)) * self.idf[col]
+        cols = np.fromiter(weights.keys(), dtype=np.int32, count=len(weights))
+        vals = np.fromiter(weights.values(), dtype=np.float32, count=len(weights))
+        norm = np.linalg.norm(vals)
+        return cols, (vals / norm if norm else vals)
+
+    def build(self, items: Sequence, bids: Iterable[Tuple[int, int]] = ()) -> None:
+        """Rebuild from scratch: `items` are Item-like, `bids` (user_id, item_id)."""
+        docs = [set(tokenize(f"{i.name} {i.description or ''}")) for i in items]
+        df = Counter(t for d in docs for t in d)
+        terms = [t for t, _ in df.most_common(self.max_features)]
+        n = max(len(items), 1)
+
+        # built aside, so readers keep the old state meanwhile
+        fresh = Recommender(self.max_features)
+        fresh.vocab = {t: col for col, t in enumerate(terms)}
+        fresh.idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in terms],
+                             dtype=np.float32)
+        fresh.log_price = np.zeros(max(len(items), 16), dtype=np.float32)
+        for item in items:
+            fresh._append(item)
+        for user_id, item_id in bids:
+            fresh._add_bid(user_id, item_id)
+
+        with self._lock:
+            for name in _STATE:
+                setattr(self, name, getattr(fresh, name))
+            self._generation += 1
+            self._cache.clear()
+
+    def _append(self, item) -> None:
+        vector = self._vector(item)
+        if item.id in self.row_of:
+            r = self.row_of[item.id]
+            for col in self.vectors[r][0]:
+                self.postings[col].drop(r)
+            self.vectors[r] = vector
+        else:
+            if self.size == len(self.log_price):
+                # amortised O(1) growth
+                self.log_price = np.resize(self.log_price, max(self.size * 2, 16))
+            r = self.size
+            self.size += 1
+            self.row_of[item.id] = r
+            self.ids.append(item.id)
+            self.vectors.append(vector)
+        for col, weight in zip(*vector):
+            self.postings.setdefault(int(col), _Postings()).add(r, weight)
+        self.log_price[r] = math.log1p(max(item.price or 0.0, 0.0))
+        self.meta[item.id] = {"id": item.id, "name": item.name,
+                              "price": item.price, "image_url": item.image_url}
+
+    def add_item(self, item) -> None:
+        """Add or refresh one item using the current vocabulary."""
+        with self._lock:
+            self._append(item)
+            self._generation += 1
+            self._cache.clear()
+
+    def _add_bid(self, user_id: int, item_id: int) -> Set[int]:
+        seen = self._user_items[user_id]
+        if item_id in seen:
+            return set()
+        for other in seen:
+            self._co[item_id][other] += 1
+            self._co[other][item_id] += 1
+        touched = set(seen) | {item_id}
+        seen.add(item_id)
+        return touched
+
+    def record_bid(self, user_id: int, item_id: int) -> None:
+        with self._lock:
+            touched = self._add_bid(user_id, item_id)
+            if touched:
+                self._generation += 1
+                # only answers involving the touched items change
+                for key in [k for k in self._cache if touched.intersection(k)]:
+                    del self._cache[key]
+
+    # ─── Queries ──────────────────────────────────────────────────────────────
+
+    def similar(self, item_ids: Iterable[int], k: int = 4) -> List[int]:
+        """Top-k item ids similar to all of `item_ids` (an item page or a cart)."""
+        key = tuple(sorted(set(item_ids)))
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and (len(hit) >= k or len(hit) + len(key) >= self.size):
+                self._cache.move_to_end(key)
+                return hit[:k]
+            rows = [self.row_of[i] for i in key if i in self.row_of]
+            if not rows or self.size <= len(rows):
+                return []
+
+            # snapshot what scoring needs; rows appended later lie past `size`
+            generation, size, ids = self._generation, self.size, self.ids
+            query: Counter = Counter()
+            for r in rows:
+                for col, weight in zip(*self.vectors[r]):
+                    query[int(col)] += float(weight)
+            postings = [(self.postings[col].view(), weight) for col, weight in query.items()]
+            lp = self.log_price[:size].copy()
+            boosts = []
+            for i in key:
+                co = self._co.get(i)
+                if co:
+                    total = sum(co.values())
+                    boosts += [(self.row_of[other], CO_WEIGHT * n / total)
+                               for other, n in co.items() if other in self.row_of]
+
+        # cosine similarity: only rows sharing a term with the query score above 0
+        scores = np.zeros(size)
+        if postings:
+            hit_rows = np.concatenate([p[0] for p, _ in postings])
+            hit_weights = np.concatenate([p[1] * w for p, w in postings])
+            scores += np.bincount(hit_rows, weights=hit_weights, minlength=size)[:size]
+        # price closeness on a log scale: 10 vs 20 counts like 100 vs 200
+        scores += PRICE_WEIGHT * len(rows) * np.exp(-np.abs(lp - lp[rows].mean()))
+        for r, boost in boosts:
+            if r < size:
+                scores[r] += boost
+        scores[rows] = -np.inf
+
+        # keep a few spare so smaller k can reuse the cached answer
+        want = min(max(k, 8), size - len(rows))
+        top = np.argpartition(-scores, want - 1)[:want]
+        top = top[np.argsort(-scores[top])]
+        result = [ids[r] for r in top]
+
+        with self._lock:
+            # anything changed meanwhile makes this answer stale, not wrong
+            if self._generation == generation:
+                self._cache[key] = result
+                if len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return result[:k]
+
+    def similar_items(self, item_ids: Iterable[int], k: int = 4) -> List[dict]:
+        return [self.meta[i] for i in self.similar(item_ids, k) if i in self.meta]
+
+    # ─── DB ───────────────────────────────────────────────────────────────────
+
+    def load(self, db: Session) -> None:
+        items = db.query(Item).all()
+        bids = db.query(Bid.user_id, Bid.item_id).distinct().all()
+        self.build(items, bids)
+
+
+recommender = Recommender()
@@ -0,0 +1,321 @@
+"""
+Server-side `request.session`.
+
+Replaces Starlette's SessionMiddleware, which signs and ships the whole
+session (user id, cart, flags) in the cookie on every response. Here the
+cookie carries only an opaque random id and the data lives in a store:
+
+* `DBStore` – the `web_sessions` table (default; survives restarts and
+  works across workers), optionally read through a per-process LRU
+  (`CachedStore`, SESSION_CACHE=1) so a returning session costs a dict
+  lookup rather than a DB round trip;
+* `MemoryStore` – an LRU dict in this process, for development or a
+  single worker;
+* `RedisStore` – a shared Redis, if the optional `redis` package is
+  installed.
+
+`request.session` is still a plain dict. The middleware remembers the
+JSON it loaded and writes back only if the session now serialises
+differently (so nested changes like a cart append are caught too). An
+unchanged session is re-stamped at most once per half TTL, and that is
+also the only time an existing cookie is re-sent. Expired rows are
+deleted in bulk by `expire()`, which main.py runs on a timer.
+
+The session id is rotated when `user_id` changes (login), and an emptied
+session (logout) is deleted and its cookie cleared. Paths under
+`skip_prefixes` (the static mount) get no session at all.
+
+The read-through cache is off by default: a worker would keep serving its
+cached copy of a session another worker has since changed or deleted (a
+logout, a cart). Only turn it on with a single worker or sticky load
+balancing.
+"""
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from models import WebSession
+
+try:
+    import redis
+except ImportError:             # optional
+    redis = None
+
+BACKEND        = os.getenv("SESSION_BACKEND", "db")          # "db", "memory" or "redis"
+TTL            = int(os.getenv("SESSION_TTL", str(14 * 24 * 3600)))
+MAX_ENTRIES    = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+REDIS_URL      = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "600"))
+CACHE          = os.getenv("SESSION_CACHE", "0") == "1"        # LRU in front of "db"
+COOKIE_NAME    = "session"
+ID_LENGTH      = 43                                           # token_urlsafe(32)
+
+# (serialised data, expiry epoch)
+Loaded = Tuple[str, float]
+
+
+def _utc(ts: float) -> datetime:
+    # naive UTC, like the rest of the models
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+class MemoryStore:
+    """Per-process LRU."""
+    blocking = False
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Loaded]" = OrderedDict()
+        self._lock = threading.Lock()           # CachedStore uses it from threads
+
+    def peek(self, sid: str) -> Optional[Loaded]:
+        return self.load(sid)
+
+    def load(self, sid: str) -> Optional[Loaded]:
+        with self._lock:
+            hit = self._data.get(sid)
+            if hit is None:
+                return None
+            if hit[1] <= time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return hit
+
+    def save(self, sid: str, data: str, expires: float) -> None:
+        with self._lock:
+            self._data[sid] = (data, expires)
+            self._data.move_to_end(sid)
+            if len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def touch(self, sid: str, expires: float) -> None:
+        with self._lock:
+            hit = self._data.get(sid)
+            if hit is not None:
+                self._data[sid] = (hit[0], expires)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def expire(self, now: float) -> int:
+        # least recently used first: stop at the first live entry; anything
+        # expired further in is dropped on its next load()
+        n = 0
+        with self._lock:
+            while self._data:
+                sid, (_, expires) = next(iter(self._data.items()))
+                if expires > now:
+                    break
+                del self._data[sid]
+                n += 1
+        return n
+
+
+class DBStore:
+    blocking = True
+
+    def __init__(self, maker: sessionmaker):
+        self.maker = maker
+
+    def peek(self, sid: str) -> Optional[Loaded]:
+        return None
+
+    def load(self, sid: str) -> Optional[Loaded]:
+        with self.maker() as db:
+            row = db.get(WebSession, sid)
+            if row is None or row.expires_at <= datetime.utcnow():
+                return None
+            return row.data, row.expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+    def save(self, sid: str, data: str, expires: float) -> None:
+        with self.maker() as db:
+            db.merge(WebSession(id=sid, data=data, expires_at=_utc(expires)))
+            db.commit()
+
+    def touch(self, sid: str, expires: float) -> None:
+        with self.maker() as db:
+            db.execute(update(WebSession).where(WebSession.id == sid)
+                       .values(expires_at=_utc(expires)))
+            db.commit()
+
+    def delete(self, sid: str) -> None:
+        with self.maker() as db:
+            db.execute(delete(WebSession).where(WebSession.id == sid))
+            db.commit()
+
+    def expire(self, now: float) -> int:
+        with self.maker() as db:
+            n = db.execute(delete(WebSession).where(WebSession.expires_at <= _utc(now))).rowcount
+            db.commit()
+            return n
+
+
+class RedisStore:
+    """Shared across workers and hosts; Redis expires keys itself."""
+    blocking = True
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "session:"):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def peek(self, sid: str) -> Optional[Loaded]:
+        return None
+
+    def load(self, sid: str) -> Optional[Loaded]:
+        data, ttl = self.client.pipeline().get(self.prefix + sid).ttl(self.prefix + sid).execute()
+        if data is None:
+            return None
+        return data.decode(), time.time() + max(ttl, 0)
+
+    def save(self, sid: str, data: str, expires: float) -> None:
+        self.client.set(self.prefix + sid, data, ex=max(int(expires - time.time()), 1))
+
+    def touch(self, sid: str, expires: float) -> None:
+        self.client.expire(self.prefix + sid, max(int(expires - time.time()), 1))
+
+    def delete(self, sid: str) -> None:
+        self.client.delete(self.prefix + sid)
+
+    def expire(self, now: float) -> int:
+        return 0
+
+
+class CachedStore:
+    """Read-through LRU (with each session's stored expiry) in front of `backend`."""
+    blocking = True
+
+    def __init__(self, backend, cache: Optional[MemoryStore] = None):
+        self.backend = backend
+        self.cache = cache or MemoryStore()
+
+    def peek(self, sid: str) -> Optional[Loaded]:
+        return self.cache.load(sid)
+
+    def load(self, sid: str) -> Optional[Loaded]:
+        hit = self.cache.load(sid)
+        if hit is None:
+            hit = self.backend.load(sid)
+            if hit is not None:
+                self.cache.save(sid, *hit)
+        return hit
+
+    def save(self, sid: str, data: str, expires: float) -> None:
+        self.backend.save(sid, data, expires)
+        self.cache.save(sid, data, expires)
+
+    def touch(self, sid: str, expires: float) -> None:
+        self.backend.touch(sid, expires)
+        self.cache.touch(sid, expires)
+
+    def delete(self, sid: str) -> None:
+        self.backend.delete(sid)
+        self.cache.delete(sid)
+
+    def expire(self, now: float) -> int:
+        self.cache.expire(now)
+        return self.backend.expire(now)
+
+
+def make_store(backend: str, maker: sessionmaker):
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "redis":
+        return RedisStore()
+    return CachedStore(DBStore(maker)) if CACHE else DBStore(maker)
+
+
+async def call(store, fn, *args):
+    """Run a store method, off the event loop if it does I/O."""
+    if store.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+class ServerSessionMiddleware:
+    def __init__(self, app, store, ttl: int = TTL, cookie_name: str = COOKIE_NAME,
+                 path: str = "/", same_site: str = "lax", https_only: bool = False,
+                 skip_prefixes: Sequence[str] = ()):
+        self.app = app
+        self.store = store
+        self.skip_prefixes = tuple(skip_prefixes)
+        self.ttl = ttl
+        self.cookie_name = cookie_name
+        self.flags = f"path={path}; httponly; samesite={same_site}"
+        if https_only:
+            self.flags += "; secure"
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] not in ("http", "websocket")
+                or scope["path"].startswith(self.skip_prefixes)):
+            return await self.app(scope, receive, send)
+
+        sid = HTTPConnection(scope).cookies.get(self.cookie_name)
+        loaded = None
+        if sid and len(sid) == ID_LENGTH:
+            # a cache hit needs no thread hop
+            loaded = self.store.peek(sid) or await call(self.store, self.store.load, sid)
+        if loaded is None:
+            sid = None
+        raw, expires = loaded or ("{}", 0.0)
+        scope["session"] = json.loads(raw)
+
+        if scope["type"] == "websocket":
+            # nothing is written back from a websocket
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                cookie = await self._commit(sid, raw, expires, scope["session"])
+                if cookie:
+                    MutableHeaders(scope=message).append("Set-Cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _commit(self, sid: Optional[str], raw: str, expires: float,
+                      session: dict) -> Optional[str]:
+        """Persist if needed; returns a Set-Cookie value or None."""
+        store, now = self.store, time.time()
+        if not session:
+            if sid is None:
+                return None
+            await call(store, store.delete, sid)
+            return (f"{self.cookie_name}=null; {self.flags}; "
+                    "expires=Thu, 01 Jan 1970 00:00:00 GMT")
+
+        data = json.dumps(session, separators=(",", ":"))
+        if sid is not None and data == raw:
+            if expires - now > self.ttl / 2:
+                return None                     # the common case: no I/O at all
+            await call(store, store.touch, sid, now + self.ttl)
+            return self._cookie(sid)
+
+        new_id = sid is None
+        if sid is not None and json.loads(raw).get("user_id") != session.get("user_id"):
+            # logged in (or switched user): don't keep a pre-login id
+            await call(store, store.delete, sid)
+            new_id = True
+        if new_id:
+            sid = secrets.token_urlsafe(32)
+        await call(store, store.save, sid, data, now + self.ttl)
+        if new_id or expires - now <= self.ttl / 2:
+            return self._cookie(sid)
+        return None
+
+    def _cookie(self, sid: str) -> str:
+        return f"{self.cookie_name}={sid}; {self.flags}; Max-Age={self.ttl}"
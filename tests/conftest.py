@@ -0,0 +1,17 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory SQLite session with every model's table."""
+    # imported here: database.py builds its engine from MYSQL_* at import,
+    # and tests that need no database shouldn't depend on those being set
+    from database import Base
+
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
@@ -0,0 +1,80 @@
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from analytics import EventBuffer
+from models import Event, ItemEventCount
+
+
+def test_ring_is_bounded():
+    buf = EventBuffer(maxlen=3)
+    for i in range(1, 6):
+        buf.track("view", i)
+    assert len(buf) == 3
+    assert buf.dropped == 2
+    assert [e[2] for e in buf.drain()] == [3, 4, 5]
+
+
+def test_flush_writes_events_and_hourly_counters(db):
+    buf = EventBuffer()
+    for _ in range(3):
+        buf.track("view", 1, 42)
+    buf.track("cart", 1)
+    assert buf.flush(db) == 4
+    assert len(buf) == 0
+
+    buf.track("view", 1)
+    buf.flush(db)
+    assert db.query(Event).count() == 5
+    counts = {(c.kind, c.count) for c in db.query(ItemEventCount)}
+    assert counts == {("view", 4), ("cart", 1)}
+
+
+def test_file_sink_rolls_by_hour(db, tmp_path):
+    buf = EventBuffer()
+    buf.track("view", 7, 1)
+    buf.flush(db, sink="file", events_dir=str(tmp_path))
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and files[0].name == time.strftime("%Y%m%d%H.jsonl", time.gmtime())
+    assert json.loads(files[0].read_text())["item_id"] == 7
+    assert db.query(Event).count() == 0
+    assert db.query(ItemEventCount).one().count == 1
+
+
+def test_out_of_range_item_ids_are_not_buffered():
+    buf = EventBuffer()
+    buf.track("cart", 10**20)
+    buf.track("cart", 0)
+    assert len(buf) == 0 and buf.rejected == 2
+
+
+def test_bad_event_is_rejected_without_blocking_the_rest(db):
+    buf = EventBuffer()
+    buf.track("view", 1)
+    buf._ring.append((time.time(), "cart", 10**20, None))     # slipped past track()
+    buf.track("view", 2)
+    assert buf.flush(db) == 2
+    assert (len(buf), buf.rejected) == (0, 1)
+    assert sorted(e.item_id for e in db.query(Event)) == [1, 2]
+
+
+def test_outage_requeues_and_keeps_the_newest_events(db):
+    buf = EventBuffer(maxlen=3)
+    for i in (1, 2, 3):
+        buf.track("view", i)
+    batch = buf.drain()
+    buf.track("view", 4)                                   # arrived while flushing
+    buf.requeue(batch)
+    assert [e[2] for e in buf.drain()] == [2, 3, 4]
+    assert buf.dropped == 1
+
+    buf.track("view", 5)
+    down = sessionmaker(bind=create_engine("sqlite+pysqlite:///:memory:"))()   # no tables
+    with pytest.raises(Exception):
+        buf.flush(down)
+    assert len(buf) == 1 and buf.rejected == 0
+    assert buf.flush(db) == 1
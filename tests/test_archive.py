@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta
+
+import archive
+from archive import RoomArchive, archive_old_messages, archived_rooms, load_history, valid_room
+from models import Message, User
+
+
+def _seed(db, n, start):
+    user = User(username="ann", email="ann@example.com", password="x")
+    db.add(user)
+    db.flush()
+    for i in range(n):
+        db.add(Message(room="general", sender_id=user.id, content=f"m{i}",
+                       timestamp=start + timedelta(minutes=i)))
+    db.commit()
+
+
+def test_room_archive_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "BLOCK_MESSAGES", 3)
+    arc = RoomArchive("auction_5/../x", str(tmp_path))
+    arc.append([{"id": i, "ts": float(i), "sender": "a", "content": str(i)} for i in range(10)])
+
+    assert len(arc.index()) == 4            # 3+3+3+1 rows
+    assert arc.max_id() == 9
+    assert [r["id"] for r in arc.before(None, 4)] == [6, 7, 8, 9]
+    assert [r["id"] for r in arc.before(5.0, 3)] == [2, 3, 4]
+    assert arc.before(0.0, 3) == []
+    assert archived_rooms(str(tmp_path)) == ["auction_5/../x"]
+
+
+def test_dot_rooms_stay_inside_the_archive(tmp_path):
+    base = tmp_path / "archive"
+    for room in (".", ".."):
+        RoomArchive(room, str(base)).append([{"id": 1, "ts": 1.0, "sender": "a", "content": "x"}])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["archive"]
+    assert sorted(p.name for p in base.iterdir()) == ["room-.", "room-.."]
+    assert sorted(archived_rooms(str(base))) == [".", ".."]
+    assert not valid_room("..") and not valid_room(".") and not valid_room("")
+    assert valid_room("general") and valid_room("a..b")
+
+
+def test_archive_moves_old_rows_and_history_falls_through(db, tmp_path):
+    start = datetime.utcnow() - timedelta(days=60)
+    _seed(db, 10, start)
+    # keep the 4 newest rows live
+    older_than = datetime.utcnow() - (start + timedelta(minutes=5, seconds=30))
+    moved = archive_old_messages(db, older_than=older_than, base=str(tmp_path))
+
+    assert moved == 6
+    assert db.query(Message).count() == 4
+    # running again is a no-op
+    assert archive_old_messages(db, older_than=older_than, base=str(tmp_path)) == 0
+
+    page = load_history(db, "general", limit=7, base=str(tmp_path))
+    assert [m["content"] for m in page] == [f"m{i}" for i in range(3, 10)]
+    assert page[0]["sender"] == "ann"
+
+    older = load_history(db, "general", before=datetime.fromisoformat(page[0]["ts"]),
+                         limit=50, base=str(tmp_path))
+    assert [m["content"] for m in older] == ["m0", "m1", "m2"]
+
+
+def test_concurrent_appends_do_not_interleave(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "BLOCK_MESSAGES", 2)
+    rows = [{"id": i, "ts": float(i), "sender": "a", "content": "x" * 50} for i in range(1, 41)]
+
+    # separate instances, as separate workers (or cron) would have
+    def run():
+        arc = RoomArchive("general", str(tmp_path))
+        for i in range(0, len(rows), 4):
+            arc.append(rows[i:i + 4])
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    arc = RoomArchive("general", str(tmp_path))
+    assert len(arc.index()) == 20               # every row archived exactly once
+    assert [r["id"] for r in arc.before(None, 100)] == list(range(1, 41))
+    assert RoomArchive("general", str(tmp_path)).append(rows[:5]) == 0
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from auctions import AuctionScheduler, close_auction, highest_bid, load_schedule
+from models import Bid, Item, User
+
+
+def test_open_window_and_soft_close():
+    s = AuctionScheduler(soft_close=30, extension=60)
+    s.schedule(1, start=100.0, end=200.0)
+
+    assert not s.is_open(1, now=50.0)
+    assert s.is_open(1, now=150.0)
+    assert not s.is_open(1, now=200.0)
+    assert not s.is_open(2, now=150.0)
+
+    assert s.bid_placed(1, now=150.0) is None       # not near the end
+    assert s.bid_placed(1, now=185.0) == 245.0      # sniping bid extends
+    assert s.ends_at(1) == 245.0
+    assert s.is_open(1, now=220.0)
+
+
+def test_due_events_skip_stale_entries():
+    s = AuctionScheduler(soft_close=30, extension=60)
+    s.schedule(1, start=None, end=100.0)
+    s.schedule(2, start=None, end=110.0)
+    s.bid_placed(1, now=90.0)                       # item 1 now ends at 150
+    s.cancel(2)
+
+    due, next_at = s._pop_due(now=120.0)
+    assert due == [] and next_at == 150.0
+    due, next_at = s._pop_due(now=150.0)
+    assert due == [(1, "end")] and next_at is None
+    assert not s.is_scheduled(1)
+    assert not s.accepts_bids(1, now=150.0)         # closed, not merely unscheduled
+    assert s.accepts_bids(3)                        # untimed
+
+    s.schedule(1, start=None, end=300.0)            # relisted
+    assert s.accepts_bids(1, now=200.0)
+
+
+def test_runner_fires_callbacks_in_order():
+    async def run():
+        s = AuctionScheduler()
+        fired = []
+
+        async def on_start(item_id):
+            fired.append(("start", item_id))
+
+        async def on_close(item_id):
+            fired.append(("close", item_id))
+
+        s.on_start, s.on_close = on_start, on_close
+        task = asyncio.create_task(s.run())
+        await asyncio.sleep(0)
+        now = time.time()
+        s.schedule(2, start=None, end=now + 0.05)
+        s.schedule(1, start=now + 0.01, end=now + 0.03)
+        await asyncio.sleep(0.15)
+        task.cancel()
+        return fired
+
+    assert asyncio.run(run()) == [("start", 1), ("close", 1), ("close", 2)]
+
+
+def test_close_auction_picks_highest_bid(db):
+    db.add_all([
+        User(id=1, username="a", email="a@x", password="x"),
+        User(id=2, username="b", email="b@x", password="x"),
+        Item(id=5, name="Ruby", price=1, auction_live=True),
+        Bid(item_id=5, user_id=1, amount=10),
+        Bid(item_id=5, user_id=2, amount=25),
+    ])
+    db.commit()
+
+    won = close_auction(db, 5)
+    assert won.user.username == "b" and won.amount == 25
+    item = db.get(Item, 5)
+    assert item.winner_id == 2 and not item.auction_live
+
+
+def test_load_schedule_rearms_every_unfinished_auction(db):
+    now = datetime.utcnow()
+    db.add_all([
+        User(id=1, username="a", email="a@x", password="x"),
+        # ended while the server was down, never marked live
+        Item(id=1, name="a", price=1, auction_end=now - timedelta(hours=1)),
+        Item(id=2, name="b", price=1, auction_live=True, auction_end=now + timedelta(hours=1)),
+        Item(id=3, name="c", price=1, auction_start=now + timedelta(hours=1),
+             auction_end=now + timedelta(hours=2)),
+        Item(id=4, name="d", price=1, auction_end=now - timedelta(hours=1), winner_id=1),
+        Item(id=5, name="e", price=1),
+    ])
+    db.commit()
+
+    scheduler = AuctionScheduler()
+    assert load_schedule(db, scheduler) == 3
+    assert [i for i in range(1, 6) if scheduler.is_scheduled(i)] == [1, 2, 3]
+    assert not scheduler.accepts_bids(4)            # already won
+    due, _ = scheduler._pop_due(time.time())
+    assert due == [(1, "end")]
+
+
+def test_only_bids_of_the_current_run_count(db):
+    now = datetime.utcnow()
+    db.add_all([
+        User(id=1, username="a", email="a@x", password="x"),
+        User(id=2, username="b", email="b@x", password="x"),
+        Item(id=5, name="Ruby", price=1, auction_live=True,
+             auction_start=now - timedelta(hours=1), auction_end=now + timedelta(hours=1)),
+        Bid(item_id=5, user_id=1, amount=99, timestamp=now - timedelta(days=3)),   # earlier run
+        Bid(item_id=5, user_id=2, amount=20, timestamp=now - timedelta(minutes=5)),
+    ])
+    db.commit()
+
+    assert highest_bid(db, 5).amount == 20
+    assert close_auction(db, 5).user_id == 2
@@ -0,0 +1,131 @@
+import email.message
+import io
+import json
+
+import pytest
+from sqlalchemy import text
+
+import catalog
+from models import Item
+
+CSV = b"""name,description,price,image_url
+Ruby,Deep red,120.5,/static/uploads/ruby.jpg
+Opal,,80,
+Broken,,not-a-price,
+"""
+
+
+def test_csv_import_in_chunks_and_rejects_bad_rows(db):
+    result = catalog.import_items(db, catalog.iter_rows(io.BytesIO(CSV), "csv"), chunk_size=1)
+
+    assert (result.inserted, result.updated, result.failed) == (2, 0, 1)
+    assert result.errors[0]["line"] == 4
+    opal = db.query(Item).filter_by(name="Opal").one()
+    assert opal.price == 80 and opal.description is None and opal.image_url is None
+
+
+def test_jsonl_upsert_by_id(db):
+    db.add(Item(id=7, name="Old", price=1))
+    db.commit()
+    lines = b"\n".join(json.dumps(r).encode() for r in [
+        {"id": 7, "name": "Sapphire", "price": 300},
+        {"id": 9, "name": "Emerald", "price": 250, "description": "green"},
+    ]) + b"\n{oops\n"
+    result = catalog.import_items(db, catalog.iter_rows(io.BytesIO(lines), "jsonl"))
+
+    assert (result.inserted, result.updated, result.failed) == (1, 1, 1)
+    db.expire_all()
+    assert db.get(Item, 7).name == "Sapphire"
+    assert db.get(Item, 9).description == "green"
+
+
+def _jsonl(*rows):
+    return catalog.iter_rows(io.BytesIO(b"\n".join(json.dumps(r).encode() for r in rows)), "jsonl")
+
+
+def test_repeated_and_out_of_range_ids(db):
+    result = catalog.import_items(db, _jsonl(
+        {"id": 3, "name": "First", "price": 1},
+        {"id": 3, "name": "Second", "price": 2},
+        {"id": 10**20, "name": "Huge", "price": 1},
+        {"id": 0, "name": "Zero", "price": 1},
+    ))
+    assert (result.inserted, result.updated, result.failed) == (1, 0, 2)
+    assert [e["line"] for e in result.errors] == [3, 4]
+    assert db.get(Item, 3).name == "Second"
+
+
+def test_update_keeps_columns_missing_from_the_row(db):
+    db.add(Item(id=5, name="Ruby", description="red", price=10, image_url="/r.jpg"))
+    db.commit()
+    result = catalog.import_items(db, _jsonl(
+        {"id": 5, "name": "Ruby", "price": 12},
+        {"name": "Opal", "price": 3},
+    ))
+    assert (result.inserted, result.updated) == (1, 1)
+    db.expire_all()
+    ruby = db.get(Item, 5)
+    assert (ruby.price, ruby.description, ruby.image_url) == (12, "red", "/r.jpg")
+
+
+def test_db_error_fails_only_the_bad_row(db):
+    db.execute(text("CREATE TRIGGER no_bad BEFORE INSERT ON items WHEN NEW.name = 'Bad' "
+                    "BEGIN SELECT RAISE(ABORT, 'bad row'); END"))
+    db.commit()
+    result = catalog.import_items(db, _jsonl(
+        {"name": "Good", "price": 1},
+        {"name": "Bad", "price": 1},
+        {"name": "Fine", "price": 1},
+    ))
+    assert (result.inserted, result.failed) == (2, 1)
+    assert result.errors == [{"line": 2, "error": "bad row"}]
+    assert sorted(n for (n,) in db.query(Item.name)) == ["Fine", "Good"]
+
+
+def test_export_streams_every_row(db):
+    for i in range(5):
+        db.add(Item(name=f"gem{i}", price=i))
+    db.commit()
+
+    parts = list(catalog.export_lines(db, "csv", chunk_size=2))
+    assert len(parts) == 3
+    lines = "".join(parts).splitlines()
+    assert lines[0] == "id,name,description,price,image_url"
+    assert len(lines) == 6
+
+    rows = [json.loads(line) for line in "".join(catalog.export_lines(db, "jsonl")).splitlines()]
+    assert [r["name"] for r in rows] == [f"gem{i}" for i in range(5)]
+
+
+class _Response(io.BytesIO):
+    def __init__(self, body, ctype):
+        super().__init__(body)
+        self.headers = email.message.Message()
+        self.headers["Content-Type"] = ctype
+
+
+def _serve(monkeypatch, tmp_path, body, ctype):
+    monkeypatch.setattr(catalog, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(catalog, "urlopen", lambda url, timeout: _Response(body, ctype))
+
+
+def test_fetch_image_keeps_allowed_images(monkeypatch, tmp_path):
+    _serve(monkeypatch, tmp_path, b"\x89PNG\r\n\x1a\n" + b"x" * 100, "image/png")
+    path = catalog._fetch_image("https://example.com/ruby.html")
+    assert path.endswith(".png")                # from the type, not the URL
+    assert [p.suffix for p in tmp_path.iterdir()] == [".png"]
+
+
+def test_fetch_image_rejects_other_content_and_cleans_up(monkeypatch, tmp_path):
+    for body, ctype in [(b"<script>alert(1)</script>", "text/html"),
+                        (b"<svg onload=alert(1)>", "image/svg+xml"),
+                        (b"<html>", "image/png")]:
+        _serve(monkeypatch, tmp_path, body, ctype)
+        with pytest.raises(ValueError):
+            catalog._fetch_image("https://example.com/a.png")
+
+    monkeypatch.setattr(catalog, "IMAGE_MAX_BYTES", 1000)
+    _serve(monkeypatch, tmp_path, b"\xff\xd8\xff" + b"x" * 200_000, "image/jpeg")
+    with pytest.raises(ValueError):
+        catalog._fetch_image("https://example.com/big.jpg")
+    assert list(tmp_path.iterdir()) == []
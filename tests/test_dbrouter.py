@@ -0,0 +1,106 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, Integer, create_engine, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from dbrouter import PIN_KEY, PinCookieMiddleware, ReadOnlySessionError, SessionRouter
+
+
+def _engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS t (v TEXT)"))
+    return engine
+
+
+def _where(db):
+    return db.execute(text("SELECT v FROM t")).scalar()
+
+
+@pytest.fixture
+def router(tmp_path):
+    primary, replica = _engine(tmp_path / "primary.db"), _engine(tmp_path / "replica.db")
+    with primary.begin() as c:
+        c.execute(text("INSERT INTO t VALUES ('primary')"))
+    with replica.begin() as c:
+        c.execute(text("INSERT INTO t VALUES ('replica')"))
+    return SessionRouter(sessionmaker(bind=primary), [replica], pin_seconds=60, secret="s")
+
+
+def _conn(cookies=None):
+    # stands in for a Request/WebSocket
+    return SimpleNamespace(scope={}, cookies=cookies or {})
+
+
+def test_reads_go_to_replica_and_writes_to_primary(router):
+    assert _where(router.read()) == "replica"
+    assert _where(router.write()) == "primary"
+
+
+def test_commit_pins_client_reads_to_primary(router):
+    conn, other = _conn(), _conn()
+    db = router.write(conn)
+    db.execute(text("UPDATE t SET v = 'primary2'"))
+    db.commit()
+
+    until = conn.scope[PIN_KEY]
+    assert until > time.time()
+    assert _where(router.read(conn)) == "primary2"
+    assert _where(router.read(other)) == "replica"
+
+    # later requests carry the pin in a signed cookie, not in the session
+    later = _conn({PIN_KEY: router.pin_cookie(until)})
+    assert _where(router.read(later)) == "primary2"
+    forged = _conn({PIN_KEY: f"{time.time() + 999:.3f}.0123456789abcdef0123456789abcdef"})
+    assert _where(router.read(forged)) == "replica"
+    expired = _conn({PIN_KEY: router.pin_cookie(time.time() - 1)})
+    assert _where(router.read(expired)) == "replica"
+
+
+def test_pin_cookie_is_set_only_after_a_commit(router):
+    async def app(scope, receive, send):
+        if scope["path"] == "/write":
+            scope[PIN_KEY] = time.time() + 60
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    def run(path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "path": path}
+        asyncio.run(PinCookieMiddleware(app, router)(scope, None, send))
+        return [v.decode() for k, v in sent[0]["headers"] if k == b"set-cookie"]
+
+    assert run("/read") == []
+    [cookie] = run("/write")
+    assert cookie.startswith(f"{PIN_KEY}=") and "Max-Age=60" in cookie
+
+
+def test_unavailable_replica_falls_back_to_primary(tmp_path):
+    primary = _engine(tmp_path / "primary.db")
+    broken = create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db")
+    router = SessionRouter(sessionmaker(bind=primary), [broken], retry_after=60)
+
+    assert router.read().get_bind() is primary
+    assert router._down_until[0] > time.time()
+    # skipped without another connect attempt while marked down
+    assert router.read().get_bind() is primary
+
+
+def test_replica_sessions_refuse_writes(router):
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = "rows"
+        id = Column(Integer, primary_key=True)
+
+    db = router.read()
+    Base.metadata.create_all(db.get_bind())
+    db.add(Row())
+    with pytest.raises(ReadOnlySessionError):
+        db.flush()
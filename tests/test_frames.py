@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+import frames
+from frames import BidCoalescer, encode, negotiate
+
+
+def test_json_encoding_is_compact():
+    assert encode({"type": "new_bid", "amount": 5}, "json") == '{"type":"new_bid","amount":5}'
+
+
+def test_negotiate_falls_back_without_msgpack(monkeypatch):
+    monkeypatch.setattr(frames, "msgpack", None)
+    assert negotiate("msgpack") == "json"
+    assert negotiate("bogus") == "json"
+
+
+def test_msgpack_uses_short_keys():
+    msgpack = pytest.importorskip("msgpack")
+    frame = {"type": "new_bid", "user": "ann", "amount": 12.5, "count": 3}
+    packed = encode(frame, "msgpack")
+    assert msgpack.unpackb(packed) == {"t": "new_bid", "u": "ann", "a": 12.5, "n": 3}
+    assert len(packed) < len(encode(frame, "json"))
+
+
+def test_coalescer_sends_latest_bid_once_per_tick():
+    sent = []
+
+    async def broadcast(room, message):
+        sent.append((room, message))
+
+    async def run():
+        c = BidCoalescer(broadcast, tick_ms=20)
+        task = asyncio.create_task(c.run())
+        for amount in (10, 11, 12):
+            c.push("auction_1", {"type": "new_bid", "amount": amount})
+        c.push("auction_2", {"type": "new_bid", "amount": 99})
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert sorted(sent, key=lambda s: s[0]) == [
+        ("auction_1", {"type": "new_bid", "amount": 12, "count": 3}),
+        ("auction_2", {"type": "new_bid", "amount": 99, "count": 1}),
+    ]
+
+
+def test_control_frames_follow_the_pending_bid():
+    sent = []
+
+    async def broadcast(room, message):
+        sent.append((room, message["type"]))
+
+    async def run():
+        c = BidCoalescer(broadcast, tick_ms=1000)
+        c.push("auction_1", {"type": "new_bid", "amount": 10})
+        c.push("auction_2", {"type": "new_bid", "amount": 20})
+        await c.send("auction_1", {"type": "auction_closed"})
+        return c
+
+    c = asyncio.run(run())
+    assert sent == [("auction_1", "new_bid"), ("auction_1", "auction_closed")]
+    assert list(c._pending) == ["auction_2"]        # other rooms keep their tick
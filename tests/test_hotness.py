@@ -0,0 +1,47 @@
+import pytest
+
+from hotness import HotnessRanker
+from models import Item, ItemHotness
+
+HOUR = 3600.0
+
+
+def test_recent_activity_outranks_old_activity():
+    r = HotnessRanker(half_life=HOUR)
+    for _ in range(4):
+        r.record(1, 1.0, at=0.0)            # 4 points, 10 half-lives ago
+    r.record(2, 1.0, at=10 * HOUR)          # 1 point, just now
+    r.record(3, 1.5, at=9 * HOUR)           # 1.5 points, 1 half-life ago
+
+    assert r.top(3) == [2, 3, 1]
+    assert r.top(1) == [2]
+    assert r.score(3, at=10 * HOUR) == pytest.approx(0.75)
+    assert r.score(1, at=10 * HOUR) == pytest.approx(4 / 1024)
+
+
+def test_top_is_bounded_and_forget_refills():
+    r = HotnessRanker(half_life=HOUR, capacity=2)
+    for item_id, weight in [(1, 1.0), (2, 2.0), (3, 3.0)]:
+        r.record(item_id, weight, at=0.0)
+    assert r.top(5) == [3, 2]
+    r.record(1, 10.0, at=0.0)
+    assert r.top(5) == [1, 3]
+    r.forget(1)
+    assert r.top(5) == [3, 2]
+
+
+def test_snapshot_roundtrip(db):
+    db.add_all([Item(id=i, name=f"g{i}", price=1) for i in (1, 2)])
+    db.commit()
+    r = HotnessRanker(half_life=HOUR)
+    r.record(1, 1.0, at=0.0)
+    r.record(2, 5.0, at=0.0)
+    assert r.snapshot(db) == 2
+    r.record(1, 10.0, at=0.0)
+    assert r.snapshot(db) == 1              # only the changed row
+    assert r.snapshot(db) == 0
+    assert db.query(ItemHotness).count() == 2
+
+    fresh = HotnessRanker(half_life=HOUR)
+    fresh.load(db)
+    assert fresh.top(2) == [1, 2]
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Notification
+from notify import NotificationHub
+
+
+def test_emit_then_flush_persists_and_reloads(db):
+    hub = NotificationHub()
+    hub.emit(1, "outbid", item_id=5, amount=120.0, by="bob")
+    hub.emit(1, "won", item_id=6, amount=80.0)
+    hub.emit(2, "outbid", item_id=5, amount=130.0, by="eve")
+    assert hub.flush(db) == 3
+    assert db.query(Notification).count() == 3
+    assert hub.flush(db) == 0
+
+    fresh = NotificationHub()
+    inbox = fresh.inbox(1, db)
+    assert [n["kind"] for n in inbox] == ["won", "outbid"]
+    assert inbox[1]["data"] == {"item_id": 5, "amount": 120.0, "by": "bob"}
+
+
+def test_inbox_is_cached_and_bounded(db):
+    hub = NotificationHub(inbox_size=2)
+    assert not hub.cached(1)
+    assert hub.inbox(1, db) == []
+    assert hub.cached(1)
+    for i in range(3):
+        hub.emit(1, "outbid", item_id=i, amount=i)
+    # served from memory now, even without a session
+    assert [n["data"]["item_id"] for n in hub.inbox(1)] == [2, 1]
+    assert hub.unread(1) == 2
+
+
+def test_pending_rows_show_up_on_first_load(db):
+    hub = NotificationHub()
+    hub.emit(1, "won", item_id=9, amount=50)
+    assert [n["kind"] for n in hub.inbox(1, db)] == ["won"]
+
+
+def test_mark_read_is_written_on_flush(db):
+    hub = NotificationHub()
+    hub.emit(1, "outbid", item_id=1, amount=10)
+    hub.flush(db)
+    hub.inbox(1, db)
+    hub.emit(1, "outbid", item_id=1, amount=20)
+    hub.mark_read(1)
+    assert hub.unread(1) == 0
+
+    hub.flush(db)
+    assert db.query(Notification).filter_by(read=False).count() == 0
+
+
+def test_failed_flush_requeues(db):
+    hub = NotificationHub()
+    hub.emit(1, "won", item_id=1, amount=1)
+    broken = sessionmaker(bind=create_engine("sqlite+pysqlite:///:memory:"))()
+    with pytest.raises(Exception):
+        hub.flush(broken)               # no tables
+    assert hub.flush(db) == 1
+
+
+def test_live_channels_receive_only_their_user():
+    async def scenario():
+        hub = NotificationHub()
+        mine, other = hub.subscribe(1), hub.subscribe(2)
+        hub.emit(1, "outbid", item_id=3, amount=40)
+        note = await asyncio.wait_for(mine.get(), 1)
+        assert note["kind"] == "outbid"
+        assert other.empty()
+        hub.unsubscribe(1, mine)
+        hub.emit(1, "won", item_id=3, amount=40)
+        assert mine.empty()
+
+    asyncio.run(scenario())
+
+
+def test_sync_picks_up_other_workers_rows(db):
+    mine, other = NotificationHub(), NotificationHub()
+    assert mine.sync(db) == []                  # first call only sets the starting point
+    mine.inbox(1, db)
+    assert mine.cached(1)
+
+    mine.emit(1, "outbid", item_id=1, amount=10, by="bob")
+    other.emit(1, "won", item_id=2, amount=50)
+    mine.flush(db)
+    other.flush(db)
+
+    # our own row isn't reported back; the other worker's is, and drops the cache
+    assert [(u, n["kind"], n["data"]) for u, n in mine.sync(db)] == [
+        (1, "won", {"item_id": 2, "amount": 50})]
+    assert not mine.cached(1)
+    assert [n["kind"] for n in mine.inbox(1, db)] == ["won", "outbid"]
+    assert mine.sync(db) == []
+
+
+def test_stale_inbox_is_reloaded(db):
+    hub, other = NotificationHub(max_age=0), NotificationHub()
+    assert hub.inbox(1, db) == []
+    assert not hub.cached(1)
+    other.emit(1, "won", item_id=2, amount=50)
+    other.flush(db)
+    assert [n["kind"] for n in hub.inbox(1, db)] == ["won"]
@@ -0,0 +1,188 @@
+import asyncio
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from profiling import Capture, ProfilerMiddleware, ReportRing, Sampler, _requested, collapse
+
+
+def _run(app, query=b"", headers=(), path="/x"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path,
+             "query_string": query, "headers": list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _busy(ms):
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+async def _allow(scope):
+    return True
+
+
+async def _deny(scope):
+    return False
+
+
+def test_collapse_is_root_first_and_skips_idle():
+    stack = collapse(sys._getframe(), "MainThread")
+    parts = stack.split(";")
+    assert parts[0] == "MainThread"
+    assert parts[-1].startswith("test_collapse_is_root_first_and_skips_idle (test_profiling.py:")
+
+    waiting = threading.Event()
+    t = threading.Thread(target=waiting.wait, name="idle")
+    t.start()
+    time.sleep(0.05)
+    assert collapse(sys._current_frames()[t.ident], "idle") is None
+    waiting.set()
+    t.join()
+
+
+def test_disabled_passes_through_without_report():
+    ring = ReportRing()
+    called = []
+
+    async def is_admin(scope):
+        called.append(scope)
+        return True
+
+    app = ProfilerMiddleware(_ok, ring, Sampler(slow_ms=0), is_admin)
+    assert _run(app)[0]["status"] == 200
+    assert ring.list() == []
+    assert called == []                 # admin check only when asked for
+
+
+def test_requested_profile_needs_admin():
+    ring = ReportRing()
+    _run(ProfilerMiddleware(_ok, ring, Sampler(slow_ms=0), _deny), query=b"profile=1")
+    assert ring.list() == []
+
+    _run(ProfilerMiddleware(_ok, ring, Sampler(slow_ms=0), _allow),
+         headers=[(b"x-profile", b"1")])
+    [report] = ring.list()
+    assert report["reason"] == "requested"
+    assert report["status"] == 200
+
+
+def test_sample_sees_a_busy_thread():
+    done, spinning = [False], [False]
+
+    def _spin():
+        # plain loads and stores only, so this frame is the leaf whenever we look
+        while not done[0]:
+            spinning[0] = True
+
+    t = threading.Thread(target=_spin, name="worker")
+    t.start()
+    while not spinning[0]:
+        time.sleep(0.001)
+    c = Capture("GET", "/", forced=True)
+    Sampler().sample([c])
+    done[0] = True
+    t.join()
+
+    [stack] = [s for s in c.samples if s.startswith("worker;")]
+    assert stack.rsplit(";", 1)[-1].startswith("_spin (test_profiling.py:")
+
+
+def test_requested_profile_records_sql():
+    engine = create_engine("sqlite+pysqlite:///:memory:")
+
+    async def handler(scope, receive, send):
+        def work():
+            with engine.connect() as conn:
+                conn.execute(text("select 1"))
+        await asyncio.to_thread(work)
+        await _ok(scope, receive, send)
+
+    ring = ReportRing()
+    _run(ProfilerMiddleware(handler, ring, Sampler(slow_ms=0), _allow), query=b"profile=1")
+    report = ring.get(ring.list()[0]["id"])
+    assert [q["statement"] for q in report["sql"]] == ["select 1"]
+
+    # outside a capture nothing is recorded
+    with engine.connect() as conn:
+        conn.execute(text("select 2"))
+    assert report["sql_count"] == 1
+
+
+def test_only_slow_requests_are_kept():
+    async def slow(scope, receive, send):
+        await asyncio.to_thread(_busy, 200)
+        await _ok(scope, receive, send)
+
+    ring = ReportRing()
+    sampler = Sampler(interval_ms=2, slow_ms=40)
+    _run(ProfilerMiddleware(_ok, ring, sampler, _deny))
+    assert ring.list() == []
+
+    _run(ProfilerMiddleware(slow, ring, sampler, _deny))
+    [report] = ring.list()
+    assert report["reason"] == "slow"
+    assert report["duration_ms"] >= 200
+    assert report["samples"] > 0        # sampled from the 40ms mark on
+
+
+def test_streams_and_skipped_paths_are_never_slow():
+    async def stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8")]})
+        await asyncio.to_thread(_busy, 100)
+        await send({"type": "http.response.body", "body": b""})
+
+    async def slow(scope, receive, send):
+        await asyncio.to_thread(_busy, 100)
+        await _ok(scope, receive, send)
+
+    ring = ReportRing()
+    sampler = Sampler(interval_ms=2, slow_ms=20)
+    _run(ProfilerMiddleware(stream, ring, sampler, _deny))
+    _run(ProfilerMiddleware(slow, ring, sampler, _deny, skip_prefixes=("/static/",)),
+         path="/static/big.css")
+    assert ring.list() == []
+    assert sampler._inflight == {}
+
+
+def test_profile_param_is_parsed_not_matched():
+    def scope(qs):
+        return {"query_string": qs, "headers": []}
+
+    assert _requested(scope(b"profile=1"))
+    assert _requested(scope(b"a=2&profile=1"))
+    assert not _requested(scope(b"noprofile=1"))
+    assert not _requested(scope(b"profile=10"))
+
+
+def test_ring_is_bounded_and_newest_first():
+    ring = ReportRing(maxlen=2)
+    for path in ("/a", "/b", "/c"):
+        ring.add(Capture("GET", path, forced=True), 1.0, "requested")
+    assert [r["path"] for r in ring.list()] == ["/c", "/b"]
+    assert ring.get(1) is None
+
+
+def test_collapsed_format():
+    c = Capture("GET", "/", forced=True)
+    c.samples.update(["main;a;b", "main;a;b", "main;a"])
+    ring = ReportRing()
+    report = ring.add(c, 1.0, "requested")
+    assert ring.collapsed(report) == "main;a;b 2\nmain;a 1\n"
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import ratelimit
+from ratelimit import BucketBackend, InboundQueue, MemoryBackend, RateLimiter, RedisBackend
+
+
+def test_bucket_allows_burst_then_refills():
+    backend = MemoryBackend()
+    # burst of 3, 1 token/s
+    assert [backend.take_now("u", 1, 3, 1, 0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert backend.take_now("u", 1, 3, 1, 0.0) == 1.0
+    # half a second later we still need another half token
+    assert backend.take_now("u", 1, 3, 1, 0.5) == 0.5
+    assert backend.take_now("u", 1, 3, 1, 1.0) == 0.0
+
+
+def test_bucket_keys_are_independent_and_capped():
+    backend = MemoryBackend(max_keys=2)
+    backend.take_now("a", 1, 1, 1, 0.0)
+    assert backend.take_now("b", 1, 1, 1, 0.0) == 0.0
+    backend.take_now("c", 1, 1, 1, 0.0)
+    # "a" was evicted, so it starts again with a full bucket
+    assert backend.take_now("a", 1, 1, 1, 0.0) == 0.0
+
+
+def test_backend_must_implement_take():
+    with pytest.raises(TypeError):
+        BucketBackend()
+
+
+def test_redis_backend(monkeypatch):
+    monkeypatch.setattr(ratelimit, "aioredis", None)
+    with pytest.raises(RuntimeError):
+        RedisBackend("redis://localhost")
+
+    calls = []
+
+    async def script(keys, args):
+        calls.append((keys, args))
+        return {"a": b"0", "b": b"0.5", "c": b"-1"}[keys[0][-1]]
+
+    backend = object.__new__(RedisBackend)
+    backend.prefix, backend._script = "rl:", script
+    limiter = RateLimiter(2, 5, backend)
+    assert [asyncio.run(limiter.hit(k)) for k in "abc"] == [0.0, 0.5, float("inf")]
+    assert calls[0] == (["rl:a"], [2, 5, 1.0, 4])
+
+
+class _FakeWS:
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.sent = []
+
+    async def receive_json(self):
+        if not self.frames:
+            raise WebSocketDisconnect()
+        await asyncio.sleep(0)
+        return self.frames.pop(0)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_inbound_queue_rejects_over_limit():
+    async def run():
+        ws = _FakeWS([{"bid": i} for i in range(5)])
+        inbound = InboundQueue(ws, RateLimiter(rate=0.001, burst=2), "1:auction_1")
+        inbound.start()
+        got = []
+        try:
+            while True:
+                got.append(await inbound.receive())
+        except WebSocketDisconnect:
+            pass
+        await inbound.close()
+        return got, ws.sent
+
+    got, sent = asyncio.run(run())
+    assert got == [{"bid": 0}, {"bid": 1}]
+    assert len(sent) == 3
+    assert all(f["code"] == "rate_limited" and f["retry_after"] > 0 for f in sent)
@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+from recommend import Recommender
+
+
+def _item(id, name, description, price):
+    return SimpleNamespace(id=id, name=name, description=description, price=price, image_url=None)
+
+
+ITEMS = [
+    _item(1, "Burmese Ruby", "deep red ruby, pigeon blood", 900),
+    _item(2, "Thai Ruby", "red ruby with dark tone", 700),
+    _item(3, "Ceylon Sapphire", "blue sapphire from Sri Lanka", 800),
+    _item(4, "Kashmir Sapphire", "velvety blue sapphire", 5000),
+    _item(5, "Opal", "Australian fire opal", 150),
+]
+
+
+def test_text_similarity_and_cart():
+    r = Recommender()
+    r.build(ITEMS)
+    assert r.similar([1], k=1) == [2]
+    assert r.similar([3], k=1) == [4]
+    # a cart never recommends what is already in it
+    cart = r.similar([1, 3], k=3)
+    assert 1 not in cart and 3 not in cart and len(cart) == 3
+    assert r.similar_items([1], k=1)[0]["name"] == "Thai Ruby"
+
+
+def test_bid_cooccurrence_boost_and_cache_invalidation():
+    r = Recommender()
+    r.build(ITEMS, bids=[(10, 1), (10, 5), (11, 1), (11, 5)])
+    assert r.similar([5], k=1) == [1]
+    before = r.similar([3], k=1)
+
+    # a new co-bid on 3 and 5 must invalidate both cached answers
+    for user in (20, 21, 22):
+        r.record_bid(user, 3)
+        r.record_bid(user, 5)
+    assert r.similar([3], k=1) == [5]
+    assert before == [4]
+
+
+def test_incremental_add_and_fast_cached_reads():
+    r = Recommender()
+    r.build(ITEMS)
+    r.add_item(_item(6, "Star Ruby", "red ruby cabochon", 850))
+    assert r.similar([6], k=1)[0] in (1, 2)
+
+    r.similar([1])
+    start = time.perf_counter()
+    for _ in range(1000):
+        r.similar([1])
+    assert (time.perf_counter() - start) / 1000 < 1e-3
+
+
+def test_refreshing_an_item_replaces_its_terms():
+    r = Recommender()
+    r.build(ITEMS)
+    assert r.similar([5], k=1) != [1]
+    r.add_item(_item(5, "Ruby", "red ruby, pigeon blood", 900))
+    assert r.similar([5], k=1) == [1]
+    # storage is per non-zero weight, not items × vocabulary
+    assert sum(p.n for p in r.postings.values()) < len(ITEMS) * len(r.vocab)
@@ -0,0 +1,197 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import sessions
+from database import Base
+from models import WebSession
+from sessions import CachedStore, DBStore, MemoryStore, ServerSessionMiddleware
+
+
+class CountingStore(MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def save(self, sid, data, expires):
+        self.writes += 1
+        super().save(sid, data, expires)
+
+
+class CountingDBStore(DBStore):
+    def __init__(self, maker):
+        super().__init__(maker)
+        self.loads = 0
+
+    def load(self, sid):
+        self.loads += 1
+        return super().load(sid)
+
+
+def _client(store, ttl=3600):
+    async def show(request):
+        return JSONResponse(request.session)
+
+    async def add(request):
+        cart = request.session.get("cart", [])
+        cart.append(int(request.path_params["item"]))
+        request.session["cart"] = cart
+        return JSONResponse(request.session)
+
+    async def login(request):
+        request.session["user_id"] = 7
+        return JSONResponse({})
+
+    async def logout(request):
+        request.session.clear()
+        return JSONResponse({})
+
+    app = Starlette(routes=[
+        Route("/", show), Route("/add/{item}", add),
+        Route("/login", login), Route("/logout", logout),
+        Route("/static/app.css", lambda request: JSONResponse("session" in request.scope)),
+    ])
+    app.add_middleware(ServerSessionMiddleware, store=store, ttl=ttl,
+                       skip_prefixes=("/static/",))
+    return TestClient(app)
+
+
+@pytest.fixture
+def maker():
+    engine = create_engine("sqlite+pysqlite:///:memory:", poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_cookie_carries_only_an_id():
+    store = MemoryStore()
+    c = _client(store)
+    r = c.get("/add/1")
+    sid = r.cookies["session"]
+    assert len(sid) == 43
+    assert store.load(sid)[0] == '{"cart":[1]}'
+    assert c.get("/add/2").json() == {"cart": [1, 2]}
+
+
+def test_unchanged_session_is_not_written():
+    store = CountingStore()
+    c = _client(store)
+    c.get("/add/1")
+    assert store.writes == 1
+    for _ in range(3):
+        r = c.get("/")
+        assert "set-cookie" not in r.headers
+    assert store.writes == 1
+    # no session, nothing stored
+    assert _client(store).get("/").headers.get("set-cookie") is None
+    assert store.writes == 1
+
+
+def test_login_rotates_id_and_logout_clears():
+    store = MemoryStore()
+    c = _client(store)
+    before = c.get("/add/1").cookies["session"]
+    after = c.get("/login").cookies["session"]
+    assert after != before
+    assert store.load(before) is None
+    assert c.get("/").json() == {"cart": [1], "user_id": 7}
+
+    r = c.get("/logout")
+    assert "expires=Thu, 01 Jan 1970" in r.headers["set-cookie"]
+    assert store.load(after) is None
+
+
+def test_unknown_or_old_cookie_starts_fresh():
+    c = _client(MemoryStore())
+    c.cookies.set("session", "eyJ1c2VyX2lkIjogMX0=.signed.by.itsdangerous")
+    assert c.get("/").json() == {}
+
+
+def test_memory_store_lru_and_bulk_expiry():
+    now = time.time()
+    store = MemoryStore(max_entries=2)
+    store.save("a", "{}", now + 60)
+    store.save("b", "{}", now + 60)
+    store.load("a")
+    store.save("c", "{}", now + 60)
+    assert store.load("b") is None         # least recently used, evicted
+    assert store.load("a") is not None
+
+    store = MemoryStore()
+    store.save("d", "{}", now - 1)
+    store.save("e", "{}", now + 60)
+    store.save("f", "{}", now - 1)
+    assert store.expire(now) == 1          # "d" at the LRU front; "f" sits behind a live entry
+    assert store.load("f") is None         # and is dropped on load instead
+    assert store.load("e") is not None
+
+
+def test_db_store_roundtrip_touch_and_expire(maker):
+    store = DBStore(maker)
+    now = time.time()
+    store.save("x", '{"user_id":1}', now + 60)
+    store.save("x", '{"user_id":2}', now + 60)
+    data, expires = store.load("x")
+    assert data == '{"user_id":2}'
+    assert abs(expires - (now + 60)) < 1
+
+    store.touch("x", now + 600)
+    assert store.load("x")[1] > now + 500
+
+    store.save("old", "{}", now - 5)
+    assert store.load("old") is None
+    assert store.expire(now) == 1
+    with maker() as db:
+        assert [s.id for s in db.query(WebSession)] == ["x"]
+
+
+def test_db_store_behind_middleware(maker):
+    c = _client(DBStore(maker))
+    c.get("/add/3")
+    assert c.get("/add/4").json() == {"cart": [3, 4]}
+    with maker() as db:
+        assert db.query(WebSession).count() == 1
+
+
+def test_cached_db_store_reads_through_once(maker):
+    db_store = CountingDBStore(maker)
+    c = _client(CachedStore(db_store))
+    c.get("/add/5")
+    for _ in range(3):
+        assert c.get("/").json() == {"cart": [5]}
+    assert db_store.loads == 0              # saved through the cache, never read back
+
+    # another process (a restart, a cold cache) reads the row once
+    cold = CachedStore(db_store)
+    sid = c.cookies["session"]
+    assert cold.load(sid)[0] == '{"cart":[5]}'
+    assert cold.peek(sid) is not None
+    assert db_store.loads == 1
+
+    c.get("/logout")
+    with maker() as db:
+        assert db.query(WebSession).count() == 0
+
+
+def test_static_paths_skip_the_store():
+    store = CountingStore()
+    c = _client(store)
+    c.get("/add/1")
+    r = c.get("/static/app.css")
+    assert r.json() is False
+    assert "set-cookie" not in r.headers
+    assert store.writes == 1
+
+
+def test_make_store_caches_db_only_when_asked(maker, monkeypatch):
+    assert isinstance(sessions.make_store("db", maker), DBStore)
+    monkeypatch.setattr(sessions, "CACHE", True)
+    assert isinstance(sessions.make_store("db", maker), CachedStore)